@@ -1,66 +1,576 @@
-from typing import Tuple, Optional
+import heapq
+import itertools
+import math
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Tuple, Optional
+
+from metrics import METRICS, span
+from response_cache import get_response_cache, prompt_key
+
+GEMINI_MODEL = "gemini-1.5-flash"
+OPENAI_MODEL = "gpt-3.5-turbo"
+GROQ_MODEL = "mixtral-8x7b-32768"
+MODELS = {"gemini": GEMINI_MODEL, "openai": OPENAI_MODEL, "groq": GROQ_MODEL}
+
+# Provider clients are reused for the life of the process, keyed by (provider, key).
+# Every cached client must carry its own key: nothing here may rely on
+# process-global SDK configuration, or one session's calls would run on another's key.
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def _make_client(provider: str, key: str):
+    if provider == "gemini":
+        import google.generativeai as genai
+        from google.generativeai import client as genai_client
+        # configure() is global, so bind a service client made with this key to the
+        # model right away (callers hold _CLIENTS_LOCK); later configure() calls
+        # from other sessions no longer affect it
+        genai.configure(api_key=key)
+        model = genai.GenerativeModel(GEMINI_MODEL)
+        model._client = genai_client.get_default_generative_client()
+        return model
+    if provider == "openai":
+        from openai import OpenAI
+        return OpenAI(api_key=key)
+    if provider == "groq":
+        from groq import Groq
+        return Groq(api_key=key)
+    return None
 
 
 def setup_ai(provider: str, gemini_key: str, openai_key: str, groq_key: str):
     provider = provider or "none"
     provider = provider.lower()
-    if provider == "gemini":
-        if not gemini_key:
-            return None, "none"
-        try:
-            import google.generativeai as genai
-            genai.configure(api_key=gemini_key)
-            client = genai.GenerativeModel("gemini-1.5-flash")
-            return client, "gemini"
-        except Exception as e:
-            print(f"Gemini setup error: {e}")
-            return None, "none"
+    keys = {"gemini": gemini_key, "openai": openai_key, "groq": groq_key}
+    if provider not in keys or not keys[provider]:
+        return None, "none"
 
-    if provider == "openai":
-        if not openai_key:
-            return None, "none"
+    cache_key = (provider, keys[provider])
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(cache_key)
+        if client is not None:
+            return client, provider
         try:
-            import openai
-            openai.api_key = openai_key
-            return openai, "openai"
+            client = _make_client(provider, keys[provider])
         except Exception as e:
-            print(f"OpenAI setup error: {e}")
+            label = {"gemini": "Gemini", "openai": "OpenAI", "groq": "Groq"}[provider]
+            print(f"{label} setup error: {e}")
             return None, "none"
+        _CLIENTS[cache_key] = client
+        return client, provider
 
-    if provider == "groq":
-        if not groq_key:
-            return None, "none"
-        try:
-            from groq import Groq
-            client = Groq(api_key=groq_key)
-            return client, "groq"
-        except Exception as e:
-            print(f"Groq setup error: {e}")
-            return None, "none"
 
-    return None, "none"
+# Prompt-side token budget per provider. Well under the context windows: prompt
+# size is what drives time to first token, and groq's free TPM is small.
+# VIDEORAG_CONTEXT_TOKENS overrides it for every provider.
+CONTEXT_BUDGETS = {"gemini": 6000, "openai": 3000, "groq": 2000}
+DEFAULT_CONTEXT_BUDGET = 2000
+
+
+def context_budget(provider: Optional[str]) -> int:
+    env = os.getenv("VIDEORAG_CONTEXT_TOKENS")
+    if env:
+        return int(env)
+    return CONTEXT_BUDGETS.get((provider or "").lower(), DEFAULT_CONTEXT_BUDGET)
+
+
+def _norm_text(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _pack(segments, budget: int, limit: Optional[int]) -> List[Tuple[Dict, str]]:
+    kept: List[str] = []
+    costs: List[int] = []
+    packed: List[Tuple[Dict, str]] = []
+    used = 0
+    for s in segments:
+        text = (s.get("text") or "").strip()
+        norm = _norm_text(text)
+        if not norm or any(norm in k for k in kept):
+            continue
+        line = f"{s['timestamp']}: {text}"
+        cost = estimate_tokens(line, 0) + 1
+        inside = [i for i, k in enumerate(kept) if k in norm]
+        if inside:
+            # a longer window covering kept ones takes the first one's place
+            freed = sum(costs[i] for i in inside)
+            if used - freed + cost <= budget:
+                first = inside[0]
+                kept[first], costs[first], packed[first] = norm, cost, (s, line)
+                for i in reversed(inside[1:]):
+                    del kept[i], costs[i], packed[i]
+                used += cost - freed
+            continue
+        if used + cost > budget:
+            continue
+        kept.append(norm)
+        costs.append(cost)
+        packed.append((s, line))
+        used += cost
+        if limit is not None and len(packed) >= limit:
+            break
+    return packed
+
 
+def pack_lines(segments, provider: Optional[str] = None, budget: Optional[int] = None,
+               limit: Optional[int] = None) -> List[str]:
+    """Context lines for segments in the given order, deduplicated, within a token budget.
 
-def ai_answer(client, provider: str, prompt: str) -> Optional[str]:
+    A segment is skipped when its text repeats one already kept or is contained in
+    it (overlapping transcript windows), or when it no longer fits the budget. One
+    that contains kept texts replaces them, in the first one's place.
+    """
+    budget = context_budget(provider) if budget is None else budget
+    return [line for _, line in _pack(segments, budget, limit)]
+
+
+def pack_context(segments, provider: Optional[str] = None, budget: Optional[int] = None,
+                 limit: Optional[int] = None) -> str:
+    return "\n".join(pack_lines(segments, provider, budget, limit))
+
+
+def answer_prompt(question: str, context: str) -> str:
+    return (
+        "Answer the question using the lines with timestamps. "
+        "Be concise. End by citing the best timestamp.\n\n"
+        f"Question: {question}\n\n"
+        f"Context:\n{context}\n"
+    )
+
+
+def quiz_prompt(num_q: int, context: str) -> str:
+    return (
+        f"Create {num_q} multiple choice questions from the context lines. "
+        "Each item should have question, 4 options A-D, correct letter, and the timestamp. "
+        "Return as markdown, starting each item with a '### Question N' heading.\n\n"
+        f"{context}"
+    )
+
+
+def ai_answer(client, provider: str, prompt: str, use_cache: bool = True) -> Optional[str]:
+    cache = get_response_cache() if use_cache else None
+    key = prompt_key(provider, MODELS.get(provider, ""), prompt)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    answer = _ai_answer_uncached(client, provider, prompt)
+    if cache is not None and answer:
+        cache.set(key, answer)
+    return answer
+
+
+def _ai_answer_uncached(client, provider: str, prompt: str) -> Optional[str]:
     try:
-        if provider == "gemini":
-            resp = client.generate_content(prompt)
-            return getattr(resp, "text", None)
-        if provider == "openai":
-            resp = client.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.5,
-            )
-            return resp.choices[0].message.content
-        if provider == "groq":
-            resp = client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model="mixtral-8x7b-32768",
-                temperature=0.5,
-            )
-            return resp.choices[0].message.content
-        return None
+        with span("llm_call", provider=provider, mode="complete"):
+            return _complete(client, provider, prompt)
     except Exception as e:
         print(f"AI call error: {e}")
         return None
+
+
+def _complete(client, provider: str, prompt: str) -> Optional[str]:
+    if provider == "gemini":
+        resp = client.generate_content(prompt)
+        return getattr(resp, "text", None)
+    if provider == "openai":
+        resp = client.chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.5,
+        )
+        return resp.choices[0].message.content
+    if provider == "groq":
+        resp = client.chat.completions.create(
+            messages=[{"role": "user", "content": prompt}],
+            model=GROQ_MODEL,
+            temperature=0.5,
+        )
+        return resp.choices[0].message.content
+    return None
+
+
+def _delta_text(chunk) -> str:
+    try:
+        delta = chunk.choices[0].delta
+    except (AttributeError, IndexError, KeyError):
+        return ""
+    if isinstance(delta, dict):
+        return delta.get("content") or ""
+    return getattr(delta, "content", None) or ""
+
+
+def _ai_answer_stream_uncached(client, provider: str, prompt: str) -> Iterator[str]:
+    if provider == "gemini":
+        for chunk in client.generate_content(prompt, stream=True):
+            text = getattr(chunk, "text", "")
+            if text:
+                yield text
+        return
+    if provider == "openai":
+        stream = client.chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.5,
+            stream=True,
+        )
+    elif provider == "groq":
+        stream = client.chat.completions.create(
+            messages=[{"role": "user", "content": prompt}],
+            model=GROQ_MODEL,
+            temperature=0.5,
+            stream=True,
+        )
+    else:
+        return
+    for chunk in stream:
+        text = _delta_text(chunk)
+        if text:
+            yield text
+
+
+# ---- Scheduling: per-provider concurrency, RPM/TPM buckets, priority and fallback ----
+
+INTERACTIVE = 0
+BATCH = 1
+
+# (requests per minute, tokens per minute, concurrent calls); override with
+# VIDEORAG_<PROVIDER>_RPM / _TPM / _CONCURRENCY.
+DEFAULT_LIMITS = {
+    "gemini": (15, 1_000_000, 4),
+    "openai": (500, 200_000, 8),
+    "groq": (30, 6_000, 4),
+}
+
+
+def estimate_tokens(prompt: str, completion: int = 512) -> int:
+    # ~4 characters per token is close enough for budgeting
+    return len(prompt) // 4 + completion
+
+
+class SchedulerSaturatedError(RuntimeError):
+    """Every candidate provider stayed saturated for max_wait; none was called."""
+
+
+def is_rate_limited(e: Exception) -> bool:
+    msg = f"{type(e).__name__} {e}".lower()
+    return any(m in msg for m in ("429", "rate limit", "ratelimit", "quota", "resource exhausted", "too many"))
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, n: float) -> float:
+        self._refill()
+        n = min(n, self.capacity)
+        return 0.0 if self.tokens >= n else (n - self.tokens) / self.rate
+
+    def take(self, n: float):
+        self._refill()
+        self.tokens -= min(n, self.capacity)
+
+    def drain(self):
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+class _ProviderState:
+    def __init__(self, name: str, client, rpm: int, tpm: int, concurrency: int):
+        self.name = name
+        self.client = client
+        self.rpm = TokenBucket(rpm)
+        self.tpm = TokenBucket(tpm)
+        self.concurrency = concurrency
+        self.active = 0
+        self.waiters: List[Tuple[int, int]] = []
+        self.cond = threading.Condition()
+
+
+# One state per (provider, API key) for the whole process: every scheduler using a
+# key draws on the same buckets, slots and queue, as the provider's limits do.
+_PROVIDER_STATES: Dict[Tuple[str, object], _ProviderState] = {}
+_PROVIDER_STATES_LOCK = threading.Lock()
+# tickets from all schedulers meet in the shared queues, so they share one sequence
+_TICKETS = itertools.count()
+
+
+def _provider_state(name: str, key, client, limits: Dict) -> _ProviderState:
+    with _PROVIDER_STATES_LOCK:
+        state = _PROVIDER_STATES.get((name, key))
+        if state is None:
+            state = _ProviderState(name, client, *limits.get(name, DEFAULT_LIMITS.get(name, (60, 100_000, 4))))
+            _PROVIDER_STATES[(name, key)] = state
+        return state
+
+
+class LLMScheduler:
+    """Queues LLM calls per provider, highest priority first, within rate limits.
+
+    If the preferred provider can't start a call within max_wait (or answers
+    with a rate-limit error) the next configured provider is tried. Limits are
+    per API key and shared by every scheduler using that key; without `keys`
+    each client counts as its own key.
+    """
+
+    def __init__(self, clients: Dict[str, object], order: List[str], limits: Optional[Dict] = None,
+                 keys: Optional[Dict[str, str]] = None):
+        limits = limits or {}
+        keys = keys or {}
+        self.order = [p for p in order if p in clients]
+        self._states = {
+            p: _provider_state(p, keys.get(p) or id(clients[p]), clients[p], limits)
+            for p in self.order
+        }
+
+    @property
+    def providers(self) -> List[str]:
+        return list(self.order)
+
+    def _acquire(self, state: _ProviderState, priority: int, tokens: int, max_wait: float) -> bool:
+        deadline = time.monotonic() + max_wait
+        ticket = (priority, next(_TICKETS))
+        with state.cond:
+            heapq.heappush(state.waiters, ticket)
+            try:
+                while True:
+                    wait = None
+                    if state.waiters[0] == ticket and state.active < state.concurrency:
+                        wait = max(state.rpm.wait_time(1), state.tpm.wait_time(tokens))
+                        if wait == 0:
+                            state.rpm.take(1)
+                            state.tpm.take(tokens)
+                            state.active += 1
+                            return True
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    state.cond.wait(min(wait, remaining) if wait else remaining)
+            finally:
+                state.waiters.remove(ticket)
+                heapq.heapify(state.waiters)
+                state.cond.notify_all()
+
+    def _release(self, state: _ProviderState, rate_limited: bool = False):
+        with state.cond:
+            state.active -= 1
+            if rate_limited:
+                state.rpm.drain()
+            state.cond.notify_all()
+
+    def _candidates(self, provider: Optional[str]) -> List[str]:
+        if provider in self._states:
+            return [provider] + [p for p in self.order if p != provider]
+        return list(self.order)
+
+    def answer(self, prompt: str, priority: int = INTERACTIVE, provider: Optional[str] = None,
+               use_cache: bool = True, max_wait: float = 5.0, completion_tokens: int = 512,
+               raise_saturated: bool = False) -> Optional[str]:
+        # None on failure; with raise_saturated, SchedulerSaturatedError if no provider was tried
+        cache = get_response_cache() if use_cache else None
+        tokens = estimate_tokens(prompt, completion_tokens)
+        tried = False
+        for name in self._candidates(provider):
+            key = prompt_key(name, MODELS.get(name, ""), prompt)
+            if cache is not None:
+                cached = cache.get(key)
+                if cached is not None:
+                    return cached
+            state = self._states[name]
+            if not self._acquire(state, priority, tokens, max_wait):
+                print(f"AI scheduler: {name} saturated, trying next provider")
+                continue
+            tried = True
+            limited = False
+            try:
+                with span("llm_call", provider=name, mode="complete"):
+                    text = _complete(state.client, name, prompt)
+            except Exception as e:
+                limited = is_rate_limited(e)
+                print(f"AI call error ({name}): {e}")
+                if limited:
+                    continue
+                return None
+            finally:
+                self._release(state, rate_limited=limited)
+            if cache is not None and text:
+                cache.set(key, text)
+            return text
+        if raise_saturated and not tried and self.providers:
+            raise SchedulerSaturatedError("all AI providers are saturated")
+        return None
+
+    def stream(self, prompt: str, priority: int = INTERACTIVE, provider: Optional[str] = None,
+               use_cache: bool = True, max_wait: float = 5.0, completion_tokens: int = 512) -> Iterator[str]:
+        tokens = estimate_tokens(prompt, completion_tokens)
+        for name in self._candidates(provider):
+            if use_cache:
+                cached = get_response_cache().get(prompt_key(name, MODELS.get(name, ""), prompt))
+                if cached is not None:
+                    yield cached
+                    return
+            state = self._states[name]
+            if not self._acquire(state, priority, tokens, max_wait):
+                print(f"AI scheduler: {name} saturated, trying next provider")
+                continue
+            started = False
+            limited = False
+            try:
+                for text in _ai_answer_stream_checked(state.client, name, prompt, use_cache):
+                    started = True
+                    yield text
+                return
+            except Exception as e:
+                limited = is_rate_limited(e)
+                print(f"AI stream error ({name}): {e}")
+                # switching providers mid-answer would garble it; only fall back before any text
+                if started or not limited:
+                    return
+            finally:
+                self._release(state, rate_limited=limited)
+
+
+def _ai_answer_stream_checked(client, provider: str, prompt: str, use_cache: bool) -> Iterator[str]:
+    # Errors are let through so the scheduler can fall back or give up.
+    parts = []
+    t0 = time.perf_counter()
+    status = "ok"
+    try:
+        for text in _ai_answer_stream_uncached(client, provider, prompt):
+            if not parts:
+                METRICS.observe("llm_first_token", time.perf_counter() - t0, provider=provider)
+            parts.append(text)
+            yield text
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        METRICS.observe("llm_call", time.perf_counter() - t0, provider=provider, mode="stream", status=status)
+    if use_cache and parts:
+        get_response_cache().set(prompt_key(provider, MODELS.get(provider, ""), prompt), "".join(parts))
+
+
+def _limits_from_env() -> Dict[str, Tuple[int, int, int]]:
+    limits = {}
+    for name, (rpm, tpm, conc) in DEFAULT_LIMITS.items():
+        prefix = f"VIDEORAG_{name.upper()}_"
+        limits[name] = (
+            int(os.getenv(prefix + "RPM", rpm)),
+            int(os.getenv(prefix + "TPM", tpm)),
+            int(os.getenv(prefix + "CONCURRENCY", conc)),
+        )
+    return limits
+
+
+_SCHEDULERS: Dict[Tuple, LLMScheduler] = {}
+_SCHEDULERS_LOCK = threading.Lock()
+
+
+def get_llm_scheduler(provider: str, gemini_key: str, openai_key: str, groq_key: str) -> LLMScheduler:
+    """Scheduler over every provider with a key, preferred provider first; shared per key set."""
+    preferred = (provider or "none").lower()
+    keys = {"gemini": gemini_key, "openai": openai_key, "groq": groq_key}
+    sched_key = (preferred, gemini_key, openai_key, groq_key)
+    with _SCHEDULERS_LOCK:
+        sched = _SCHEDULERS.get(sched_key)
+        if sched is not None:
+            return sched
+    clients = {}
+    if preferred != "none":
+        for name in keys:
+            client, used = setup_ai(name, gemini_key, openai_key, groq_key)
+            if used != "none":
+                clients[name] = client
+    order = [preferred] + [p for p in keys if p != preferred]
+    sched = LLMScheduler(clients, order, _limits_from_env(), keys)
+    with _SCHEDULERS_LOCK:
+        return _SCHEDULERS.setdefault(sched_key, sched)
+
+
+# Quiz generation is split so each call writes a few questions from its own slice
+# of the context; the calls run side by side, so latency tracks one small call.
+QUESTIONS_PER_CALL = 3
+TOKENS_PER_QUESTION = 200
+_QUIZ_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="quiz")
+_QUESTION_RE = re.compile(r"^#{1,6}\s*Question\s+\d+", re.IGNORECASE | re.MULTILINE)
+
+
+def split_count(total: int, parts: int) -> List[int]:
+    base, extra = divmod(total, parts)
+    return [base + (1 if i < extra else 0) for i in range(parts)]
+
+
+def chunk_lines(lines: List[str], parts: int) -> List[List[str]]:
+    """Split lines into `parts` contiguous chunks of roughly equal token size."""
+    parts = max(1, min(parts, len(lines)))
+    costs = [estimate_tokens(line, 0) + 1 for line in lines]
+    target = sum(costs) / parts
+    chunks: List[List[str]] = [[]]
+    acc = 0
+    for i, (line, cost) in enumerate(zip(lines, costs)):
+        left = len(lines) - i
+        need = parts - len(chunks)
+        # close the chunk once it reaches its share, but never starve the ones after it
+        if chunks[-1] and need and (acc >= target * len(chunks) or left <= need):
+            chunks.append([])
+        chunks[-1].append(line)
+        acc += cost
+    return chunks
+
+
+def merge_quizzes(parts: List[str]) -> str:
+    """Join per-chunk quizzes, renumbering the '### Question N' headings."""
+    counter = itertools.count(1)
+    merged = []
+    for part in parts:
+        start = _QUESTION_RE.search(part)
+        # drop any per-chunk title before the first question
+        body = part[start.start():] if start else part
+        merged.append(_QUESTION_RE.sub(lambda m: f"### Question {next(counter)}", body).strip())
+    return "\n\n".join(merged)
+
+
+def quiz_map_reduce(llm: LLMScheduler, segments, num_q: int, provider: Optional[str] = None,
+                    use_cache: bool = True, max_wait: float = 30.0) -> Optional[str]:
+    """Quiz of num_q questions from parallel per-chunk calls; None if every call fails.
+
+    Each call gets up to one context budget of its own, so more questions buy
+    more context without making any single prompt or completion longer.
+    """
+    if num_q <= 0:
+        return None
+    provider = provider or (llm.providers[0] if llm.providers else None)
+    calls = math.ceil(num_q / QUESTIONS_PER_CALL)
+    packed = _pack(segments, context_budget(provider) * calls, None)
+    if not packed:
+        return None
+    # best segments win the budget, then each slice follows video order
+    packed.sort(key=lambda p: p[0].get("start_time", 0))
+    chunks = chunk_lines([line for _, line in packed], calls)
+    counts = split_count(num_q, len(chunks))
+
+    def one(chunk: List[str], n: int) -> Optional[str]:
+        return llm.answer(
+            quiz_prompt(n, "\n".join(chunk)), priority=BATCH, provider=provider, use_cache=use_cache,
+            max_wait=max_wait, completion_tokens=TOKENS_PER_QUESTION * n,
+        )
+
+    with span("quiz_map_reduce"):
+        results = list(_QUIZ_POOL.map(one, chunks, counts))
+    parts = [r for r in results if r]
+    if not parts:
+        return None
+    return merge_quizzes(parts)
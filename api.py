@@ -0,0 +1,257 @@
+"""Headless HTTP API over VideoRAG, for programmatic use and load testing.
+
+    uvicorn api:app --workers 2
+
+Reads the same keys as the Streamlit app from the environment. Set
+VIDEORAG_FAKE_BACKEND=1 to serve from fake_backend instead of VideoDB and
+a real LLM; VIDEORAG_FAKE_LATENCY sets the fake per-call latency.
+"""
+import asyncio
+import json
+import os
+import threading
+from typing import List, Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from ai_providers import (
+    INTERACTIVE,
+    LLMScheduler,
+    SchedulerSaturatedError,
+    answer_prompt,
+    get_llm_scheduler,
+    pack_context,
+    quiz_map_reduce,
+)
+from highlight_reel import build_reel
+from ingest_jobs import get_ingest_scheduler
+from metrics import render_prometheus
+from snapshot import export_snapshot, load_snapshot
+from videodb_utils import connect_videodb, ensure_collection, get_video, list_videos
+from videorag import CollectionRAG, VideoRAG
+
+VIDEODB_API_KEY = os.getenv("VIDEODB_API_KEY", "")
+AI_PROVIDER = os.getenv("VIDEORAG_AI_PROVIDER", "gemini")
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
+COLLECTION_NAME = os.getenv("VIDEORAG_COLLECTION", "educational_videos")
+FAKE_BACKEND = os.getenv("VIDEORAG_FAKE_BACKEND", "") not in ("", "0", "false")
+
+app = FastAPI(title="VideoRAG API")
+
+_FAKE = {}
+_FAKE_LOCK = threading.Lock()
+
+
+def _fake():
+    from fake_backend import FakeBackend, FakeLLM, fake_connect
+
+    with _FAKE_LOCK:
+        if not _FAKE:
+            backend = FakeBackend(latency=float(os.getenv("VIDEORAG_FAKE_LATENCY", "0.05")))
+            conn = fake_connect(backend)
+            # one ready-made lecture so load tests can search straight away
+            conn.create_collection(COLLECTION_NAME).add_video().indexed = True
+            _FAKE["conn"] = conn
+            # generous limits: load tests measure the pipeline, not the rate limiter
+            _FAKE["llm"] = LLMScheduler({"groq": FakeLLM(backend)}, ["groq"], {"groq": (100_000, 100_000_000, 8)})
+        return _FAKE
+
+
+_WARMED = set()
+_WARMED_LOCK = threading.Lock()
+
+
+def get_collection():
+    if FAKE_BACKEND:
+        coll = ensure_collection(_fake()["conn"], COLLECTION_NAME)
+    elif not VIDEODB_API_KEY:
+        raise HTTPException(status_code=503, detail="VIDEODB_API_KEY is not set")
+    else:
+        coll = ensure_collection(connect_videodb(VIDEODB_API_KEY), COLLECTION_NAME)
+    with _WARMED_LOCK:
+        if coll.id not in _WARMED:
+            # a new worker starts from the collection's snapshot instead of VideoDB
+            load_snapshot(coll.id)
+            _WARMED.add(coll.id)
+    return coll
+
+
+def get_llm() -> LLMScheduler:
+    if FAKE_BACKEND:
+        return _fake()["llm"]
+    return get_llm_scheduler(AI_PROVIDER, GEMINI_API_KEY, OPENAI_API_KEY, GROQ_API_KEY)
+
+
+def load_video(coll, video_id: str):
+    try:
+        return get_video(coll, video_id)
+    except Exception:
+        raise HTTPException(status_code=404, detail=f"Video {video_id} not found")
+
+
+class IngestRequest(BaseModel):
+    urls: List[str]
+
+
+class SearchRequest(BaseModel):
+    video_id: str
+    question: str
+    max_results: int = Field(5, ge=1, le=50)
+    stream: bool = False
+
+
+class CollectionSearchRequest(BaseModel):
+    question: str
+    max_results: int = Field(10, ge=1, le=100)
+    video_ids: Optional[List[str]] = None
+
+
+class AnswerRequest(SearchRequest):
+    use_cache: bool = True
+    stream: bool = False
+
+
+class QuizRequest(BaseModel):
+    video_id: str
+    topic: str = "main concepts"
+    num_q: int = Field(5, ge=1, le=20)
+    use_cache: bool = True
+
+
+class ReelRequest(BaseModel):
+    video_id: str
+    topics: List[str]
+    per_topic: int = Field(3, ge=1, le=10)
+
+
+def _search(video_id: str, question: str, max_results: int):
+    coll = get_collection()
+    vr = VideoRAG(load_video(coll, video_id), collection=coll)
+    segments = vr.search_video_content(question, max_results=max_results)
+    return segments, vr.last_plan
+
+
+def _search_lines(vr: VideoRAG, question: str, max_results: int):
+    # one JSON line per batch of new segments, then a final line with the plan
+    for added in vr.iter_search(question, max_results=max_results):
+        yield json.dumps({"segments": added}) + "\n"
+    yield json.dumps({"plan": vr.last_plan}) + "\n"
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "fake_backend": FAKE_BACKEND}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return render_prometheus()
+
+
+@app.get("/videos")
+async def videos():
+    coll = await asyncio.to_thread(get_collection)
+    vids = await asyncio.to_thread(list_videos, coll)
+    return {"videos": [v.id for v in vids]}
+
+
+@app.post("/snapshot")
+async def snapshot():
+    coll = await asyncio.to_thread(get_collection)
+    return await asyncio.to_thread(export_snapshot, coll)
+
+
+@app.post("/snapshot/load")
+async def snapshot_load():
+    coll = await asyncio.to_thread(get_collection)
+    return await asyncio.to_thread(load_snapshot, coll.id)
+
+
+@app.post("/ingest")
+async def ingest(req: IngestRequest):
+    coll = await asyncio.to_thread(get_collection)
+    job_ids = get_ingest_scheduler(coll).submit(urls=req.urls)
+    return {"jobs": job_ids}
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    coll = await asyncio.to_thread(get_collection)
+    job = get_ingest_scheduler(coll).get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.to_dict()
+
+
+@app.post("/search")
+async def search(req: SearchRequest):
+    if req.stream:
+        # resolve the video first so an unknown id is still a 404, not a broken stream
+        coll = await asyncio.to_thread(get_collection)
+        video = await asyncio.to_thread(load_video, coll, req.video_id)
+        vr = VideoRAG(video, collection=coll)
+        return StreamingResponse(_search_lines(vr, req.question, req.max_results),
+                                 media_type="application/x-ndjson")
+    segments, plan = await asyncio.to_thread(_search, req.video_id, req.question, req.max_results)
+    return {"segments": segments, "plan": plan}
+
+
+@app.post("/search/collection")
+async def search_collection(req: CollectionSearchRequest):
+    def run():
+        coll = get_collection()
+        vids = [load_video(coll, v) for v in req.video_ids] if req.video_ids else None
+        cr = CollectionRAG(coll, videos=vids)
+        return cr.search(req.question, max_results=req.max_results), cr.last_run
+
+    segments, run_info = await asyncio.to_thread(run)
+    return {"segments": segments, "run": run_info}
+
+
+@app.post("/answer")
+async def answer(req: AnswerRequest):
+    segments, plan = await asyncio.to_thread(_search, req.video_id, req.question, req.max_results)
+    llm = await asyncio.to_thread(get_llm)
+    context = pack_context(segments, llm.providers[0] if llm.providers else None, limit=3)
+    if not llm.providers or not context:
+        return {"answer": None, "segments": segments, "plan": plan}
+    prompt = answer_prompt(req.question, context)
+    if req.stream:
+        # sync generator; Starlette iterates it in its threadpool
+        return StreamingResponse(
+            llm.stream(prompt, priority=INTERACTIVE, use_cache=req.use_cache), media_type="text/plain"
+        )
+    try:
+        text = await asyncio.to_thread(
+            llm.answer, prompt, INTERACTIVE, None, req.use_cache, raise_saturated=True
+        )
+    except SchedulerSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    return {"answer": text, "segments": segments, "plan": plan}
+
+
+@app.post("/quiz")
+async def quiz(req: QuizRequest):
+    segments, _ = await asyncio.to_thread(_search, req.video_id, req.topic, max(8, 2 * req.num_q))
+    llm = await asyncio.to_thread(get_llm)
+    if not llm.providers or not any(s.get("text") for s in segments):
+        raise HTTPException(status_code=503, detail="AI is off or context is empty")
+    quiz_md = await asyncio.to_thread(quiz_map_reduce, llm, segments, req.num_q, None, req.use_cache)
+    if not quiz_md:
+        raise HTTPException(status_code=502, detail="AI failed. Try again or switch provider.")
+    return {"quiz": quiz_md, "segments": segments}
+
+
+@app.post("/reel")
+async def reel(req: ReelRequest):
+    def run():
+        coll = get_collection()
+        vr = VideoRAG(load_video(coll, req.video_id), collection=coll)
+        return build_reel(vr, req.topics, per_topic=req.per_topic)
+
+    result = await asyncio.to_thread(run)
+    return {"timeline": result["timeline"], "stream_url": result["stream_url"]}
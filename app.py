@@ -15,17 +15,21 @@ GROQ_API_KEY    = st.secrets.get("GROQ_API_KEY",    os.getenv("GROQ_API_KEY",
 AI_PROVIDER = st.sidebar.selectbox("AI provider", ["gemini", "none"], index=0)
 st.sidebar.caption("Keys are loaded from Streamlit secrets.")
 
-from videorag import VideoRAG
+from videorag import VideoRAG, DEFAULT_QUESTION, DEFAULT_QUIZ_TOPIC, DEFAULT_REEL_TOPICS
+from ingest_jobs import get_ingest_scheduler
+from highlight_reel import build_reel
+from snapshot import export_snapshot, load_snapshot
+from transcript_store import get_transcript_store
 from videodb_utils import (
     connect_videodb,
     ensure_collection,
-    upload_video_any,
-    ensure_index_spoken,
-    get_transcript_text_safe,
+    get_video,
     build_embed_player,
     shots_table_html,
 )
-from ai_providers import setup_ai, ai_answer
+from ai_providers import INTERACTIVE, answer_prompt, get_llm_scheduler, pack_context, quiz_map_reduce
+from response_cache import get_response_cache
+from metrics import METRICS, render_prometheus, start_metrics_server
 
 
 # --------------- App config ---------------
@@ -72,9 +76,29 @@ GROQ_API_KEY = st.sidebar.text_input(
 COLLECTION_NAME = st.sidebar.text_input("Collection name", value="educational_videos")
 TOP_K = st.sidebar.slider("Results per query", 1, 10, 5)
 MAX_SEGMENT_PREVIEW = st.sidebar.slider("Preview chars", 80, 400, 220, 20)
+USE_AI_CACHE = st.sidebar.checkbox("Reuse cached AI answers", value=True)
 
 st.sidebar.markdown("---")
 st.sidebar.caption("Tip: if AI keys are empty, the app still works with VideoDB only.")
+_ai_stats = get_response_cache().stats()
+st.sidebar.caption(f"AI cache: {_ai_stats['hits']} hits, {_ai_stats['misses']} misses")
+
+# Prometheus text on http://127.0.0.1:<port>/metrics when VIDEORAG_METRICS_PORT is set
+if os.getenv("VIDEORAG_METRICS_PORT"):
+    try:
+        start_metrics_server(int(os.getenv("VIDEORAG_METRICS_PORT")))
+    except Exception as e:
+        st.sidebar.caption(f"Metrics server not started: {e}")
+SHOW_METRICS = st.sidebar.checkbox("Show timing metrics", value=False)
+# Shows timings recorded up to the previous run; tabs may st.stop() before the end.
+if SHOW_METRICS:
+    with st.sidebar.expander("Timing metrics", expanded=True):
+        rows = METRICS.summary()
+        if rows:
+            st.table(rows)
+        else:
+            st.caption("No calls recorded yet.")
+        st.download_button("Download metrics", data=render_prometheus(), file_name="metrics.txt")
 
 
 # --------------- Header ---------------
@@ -93,6 +117,9 @@ except Exception as e:
     st.error(f"VideoDB connection error: {e}")
     st.stop()
 
+# warm from the collection's snapshot; only parts not loaded yet are read
+load_snapshot(coll.id)
+
 # --------------- Tabs ---------------
 tab_upload, tab_search, tab_quiz, tab_reel, tab_transcript = st.tabs(
     ["Upload or Link", "Ask & Search", "Quiz", "Highlight Reel", "Transcript"]
@@ -104,30 +131,49 @@ with tab_upload:
     st.subheader("Add video")
     source_type = st.radio("Choose source", ["YouTube URL", "Local upload"], horizontal=True)
 
-    chosen_url = None
-    uploaded_file = None
+    chosen_urls = []
+    uploaded_files = []
 
     if source_type == "YouTube URL":
-        chosen_url = st.text_input("Paste a YouTube link")
+        url_text = st.text_area("Paste YouTube links, one per line")
+        chosen_urls = [u.strip() for u in url_text.splitlines() if u.strip()]
         st.caption("Example: https://www.youtube.com/watch?v=fNk_zzaMoSs")
     else:
-        uploaded_file = st.file_uploader("Upload a video file", type=["mp4", "mov", "mkv", "webm"])
+        uploaded_files = st.file_uploader(
+            "Upload video files", type=["mp4", "mov", "mkv", "webm"], accept_multiple_files=True
+        ) or []
 
+    scheduler = get_ingest_scheduler(coll)
     if st.button("Ingest and index", type="primary"):
-        with st.spinner("Uploading and indexing..."):
-            try:
-                video, working_url = upload_video_any(
-                    coll, url=chosen_url, file=uploaded_file
-                )
-                if not video:
-                    st.error("Upload failed. Try another URL or file.")
-                    st.stop()
-                st.session_state["video_id"] = video.id
-                st.session_state["video_url"] = working_url
-                ensure_index_spoken(video)
-                st.success("Indexed spoken words. Ready for search.")
-            except Exception as e:
-                st.error(f"Error: {e}")
+        if not chosen_urls and not uploaded_files:
+            st.error("Provide a YouTube URL or upload a file.")
+        else:
+            job_ids = scheduler.submit(urls=chosen_urls, files=uploaded_files)
+            st.session_state.setdefault("ingest_jobs", []).extend(job_ids)
+            st.success(f"Queued {len(job_ids)} video(s). You can keep searching while they index.")
+
+    jobs = scheduler.jobs(st.session_state.get("ingest_jobs", []))
+    if jobs:
+        st.markdown("**Ingest jobs**")
+        st.table([j.to_dict() for j in jobs])
+        if any(j.state not in ("done", "failed") for j in jobs):
+            st.button("Refresh status")
+
+        done = [j for j in jobs if j.state == "done"]
+        if done:
+            labels = {f"{j.source} ({j.video_id})": j for j in done}
+            choice = st.selectbox("Active video", list(labels), index=len(labels) - 1)
+            picked = labels[choice]
+            st.session_state["video_id"] = picked.video_id
+            st.session_state["video_url"] = picked.video_url
+
+    if st.button("Save snapshot", help="Append new transcripts and cached searches so restarts start warm"):
+        with st.spinner("Saving snapshot..."):
+            saved = export_snapshot(coll)
+        if saved["part"]:
+            st.success(f"Saved {saved['transcripts']} transcript(s) and {saved['searches']} search(es).")
+        else:
+            st.info("Snapshot is already up to date.")
 
     if "video_id" in st.session_state:
         st.info(f"Active video id: {st.session_state['video_id']}")
@@ -142,7 +188,7 @@ def get_current_video():
     if not vid_id:
         return None
     try:
-        return coll.get_video(vid_id)
+        return get_video(coll, vid_id)
     except Exception:
         return None
 
@@ -155,11 +201,9 @@ with tab_search:
         st.warning("Add and index a video first in the Upload tab.")
         st.stop()
 
-    # AI setup
-    ai_client, used_provider = setup_ai(
-        AI_PROVIDER, GEMINI_API_KEY, OPENAI_API_KEY, GROQ_API_KEY
-    )
-    if used_provider == "none":
+    # AI setup: preferred provider first, others with keys as fallback
+    llm = get_llm_scheduler(AI_PROVIDER, GEMINI_API_KEY, OPENAI_API_KEY, GROQ_API_KEY)
+    if not llm.providers:
         st.caption("AI is disabled. Answers will show top matching segments.")
 
     # Build RAG engine
@@ -167,48 +211,57 @@ with tab_search:
 
     qcol1, qcol2 = st.columns([3, 1])
     with qcol1:
-        question = st.text_input("Ask a question about the video", "What is the main topic?")
+        question = st.text_input("Ask a question about the video", DEFAULT_QUESTION)
     with qcol2:
         run_btn = st.button("Search", type="primary")
 
     if run_btn and question.strip():
-        with st.spinner("Searching..."):
-            segments = vr.search_video_content(question, max_results=TOP_K)
-            if not segments:
-                # last resort: show first seconds of transcript if available
-                st.warning("No matches. Try simpler keywords like overview, definition, or example.")
-            else:
-                # show AI or basic answer
-                context = "\n".join(
-                    f"{s['timestamp']}: {s['text']}" for s in segments[:3] if s.get("text")
-                )
-                if used_provider != "none" and ai_client is not None and context:
-                    prompt = (
-                        "Answer the question using the lines with timestamps. "
-                        "Be concise. End by citing the best timestamp.\n\n"
-                        f"Question: {question}\n\n"
-                        f"Context:\n{context}\n"
-                    )
-                    answer = ai_answer(ai_client, used_provider, prompt)
-                    if answer:
-                        st.success(answer)
-                    else:
-                        best = segments[0]
-                        st.info(f"Found at {best['timestamp']} (score {best['score']}%)\n\n{best['text']}")
-                else:
-                    best = segments[0]
-                    st.info(f"Found at {best['timestamp']} (score {best['score']}%)\n\n{best['text']}")
-
-                # table of segments
-                html = shots_table_html(st.session_state.get("video_url"), segments, title="Top matches")
-                st.components.v1.html(html, height=240, scrolling=True)
-
-                # player at best segment
+        answer_slot = st.container()
+        table_slot = st.empty()
+        player_slot = st.empty()
+        segments = []
+        jumped = False
+
+        def jump_to(seg):
+            with player_slot:
                 st.components.v1.html(
-                    build_embed_player(st.session_state.get("video_url"), start=int(segments[0]["start_time"])),
+                    build_embed_player(st.session_state.get("video_url"), start=int(seg["start_time"])),
                     height=380,
                 )
 
+        with st.spinner("Searching..."):
+            # show matches as each search returns; the player jumps to the first good one
+            for added in vr.iter_search(question, max_results=TOP_K):
+                good = next((s for s in added if s.get("score", 0) >= vr.min_score), None)
+                if good is not None and not jumped:
+                    jump_to(good)
+                    jumped = True
+                segments = sorted(segments + added, key=lambda s: s.get("score", 0), reverse=True)
+                with table_slot:
+                    html = shots_table_html(st.session_state.get("video_url"), segments, title="Top matches")
+                    st.components.v1.html(html, height=240, scrolling=True)
+        if segments and not jumped:
+            jump_to(segments[0])
+
+        if vr.last_plan.get("errors"):
+            answer_slot.caption(f"Some searches failed and were skipped: {vr.last_plan['errors'][0]}")
+        if not segments:
+            # last resort: show first seconds of transcript if available
+            answer_slot.warning("No matches. Try simpler keywords like overview, definition, or example.")
+        else:
+            # show AI or basic answer above the matches
+            best = segments[0]
+            context = pack_context(segments, llm.providers[0] if llm.providers else None, limit=3)
+            answer = None
+            if llm.providers and context:
+                prompt = answer_prompt(question, context)
+                with answer_slot:
+                    answer = st.write_stream(
+                        llm.stream(prompt, priority=INTERACTIVE, use_cache=USE_AI_CACHE)
+                    )
+            if not answer:
+                answer_slot.info(f"Found at {best['timestamp']} (score {best['score']}%)\n\n{best['text']}")
+
 
 # --------------- Quiz ---------------
 with tab_quiz:
@@ -218,33 +271,26 @@ with tab_quiz:
         st.warning("Add and index a video first in the Upload tab.")
         st.stop()
 
-    topic = st.text_input("Quiz topic", "main concepts")
+    topic = st.text_input("Quiz topic", DEFAULT_QUIZ_TOPIC)
     num_q = st.slider("Number of questions", 3, 10, 5)
     make_quiz = st.button("Make quiz")
 
     if make_quiz:
         with st.spinner("Building quiz..."):
             vr = VideoRAG(video, collection=coll)
-            segments = vr.search_video_content(topic, max_results=8)
-            context = "\n".join(
-                f"{s['timestamp']}: {s['text']}" for s in segments if s.get("text")
-            )
-
-            ai_client, used_provider = setup_ai(
-                AI_PROVIDER, GEMINI_API_KEY, OPENAI_API_KEY, GROQ_API_KEY
-            )
-            if used_provider == "none" or ai_client is None or not context:
+            # more questions get more material; the quiz calls split it between them
+            segments = vr.search_video_content(topic, max_results=max(8, 2 * num_q))
+            has_text = any(s.get("text") for s in segments)
+
+            llm = get_llm_scheduler(AI_PROVIDER, GEMINI_API_KEY, OPENAI_API_KEY, GROQ_API_KEY)
+            if not llm.providers or not has_text:
                 st.warning("AI is off or context is empty. Showing basic prompts you can copy.")
                 for i in range(num_q):
+                    if not segments:
+                        break
                     st.write(f"Q{i+1}. Based on segment {segments[i % len(segments)]['timestamp']}, write a question.")
             else:
-                prompt = (
-                    f"Create {num_q} multiple choice questions from the context lines. "
-                    "Each item should have question, 4 options A-D, correct letter, and the timestamp. "
-                    "Return as markdown with headings.\n\n"
-                    f"{context}"
-                )
-                quiz_md = ai_answer(ai_client, used_provider, prompt)
+                quiz_md = quiz_map_reduce(llm, segments, num_q, use_cache=USE_AI_CACHE)
                 if quiz_md:
                     st.markdown(quiz_md)
                 else:
@@ -259,38 +305,21 @@ with tab_reel:
         st.warning("Add and index a video first in the Upload tab.")
         st.stop()
 
-    topics = st.text_input("Comma separated topics", "overview, example, key concept")
+    topics = st.text_input("Comma separated topics", ", ".join(DEFAULT_REEL_TOPICS))
     make_reel = st.button("Create reel")
 
     if make_reel:
         with st.spinner("Collecting segments..."):
             vr = VideoRAG(video, collection=coll)
             topic_list = [t.strip() for t in topics.split(",") if t.strip()]
-            all_segments = []
-            for t in topic_list:
-                segs = vr.search_video_content(t, max_results=3)
-                all_segments.extend(segs)
-
-            # dedupe and sort
-            timeline = []
-            seen = set()
-            for s in sorted(all_segments, key=lambda x: x["start_time"]):
-                key = int(s["start_time"])
-                if key in seen:
-                    continue
-                seen.add(key)
-                timeline.append((int(s["start_time"]), int(s["end_time"])))
+            reel = build_reel(vr, topic_list, per_topic=3)
+            timeline = reel["timeline"]
 
             if not timeline:
                 st.warning("No segments found for a reel. Try different topics.")
             else:
                 st.write(f"Segments: {len(timeline)}")
-                # Try to generate a playable stream from VideoDB
-                stream_url = None
-                try:
-                    stream_url = video.generate_stream(timeline=timeline)
-                except Exception:
-                    pass
+                stream_url = reel["stream_url"]
 
                 if stream_url:
                     st.video(stream_url)
@@ -312,14 +341,17 @@ with tab_transcript:
         st.stop()
 
     with st.spinner("Loading transcript..."):
-        text = get_transcript_text_safe(video)
-    if not text:
+        doc = get_transcript_store().get(video)
+    if doc is None or not doc.num_pages:
         st.warning("Transcript not available yet.")
     else:
         st.download_button(
             "Download transcript txt",
-            data=text,
+            # deferred: the full text is built only when the button is clicked
+            data=lambda: doc.open().read(),
             file_name="transcript.txt",
             mime="text/plain",
         )
-        st.text_area("Preview", value=text[:5000], height=360)
+        page = st.number_input("Page", min_value=1, max_value=doc.num_pages, value=1, step=1)
+        st.caption(f"Page {page} of {doc.num_pages}")
+        st.text_area("Preview", value=doc.page(int(page) - 1), height=360)
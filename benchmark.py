@@ -0,0 +1,155 @@
+"""Offline benchmarks for the search, ingest, quiz and reel pipelines.
+
+Runs against fake_backend, so no VideoDB or LLM keys are needed:
+
+    python benchmark.py --latency 0.05 --iterations 20
+    python benchmark.py --warm --json bench.json
+"""
+import argparse
+import json
+import statistics
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from ai_providers import INTERACTIVE, LLMScheduler, answer_prompt, pack_context, quiz_map_reduce
+from fake_backend import FakeBackend, FakeCollection, FakeLLM
+from highlight_reel import build_reel, configure_stream_cache, get_stream_cache
+from ingest_catalog import configure_ingest_catalog
+from response_cache import configure_response_cache
+from search_cache import configure_search_cache
+from transcript_index import build_transcript_index
+from videodb_utils import ensure_index_spoken, upload_video_any
+from videorag import VideoRAG
+
+QUESTIONS = [
+    "What is the main topic?",
+    "Explain the key concept",
+    "Give an example",
+    "learning rate",
+    "momentum smoothing",
+]
+REEL_TOPICS = ["overview", "example", "key concept"]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+def run_pipeline(name: str, backend: FakeBackend, iterations: int, fn: Callable[[int], None]) -> Dict:
+    backend.stats.reset()
+    latencies = []
+    errors = 0
+    tracemalloc.start()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        try:
+            fn(i)
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - t0)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    calls = dict(backend.stats.calls)
+    return {
+        "pipeline": name,
+        "iterations": iterations,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 1),
+        "calls_per_iter": round(sum(calls.values()) / iterations, 2),
+        "errors": errors,
+        "calls": calls,
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def run(latency: float, jitter: float, error_rate: float, iterations: int, warm: bool,
+        llm_latency: float, seed: int) -> List[Dict]:
+    # fresh in-memory caches and catalog, so fake rows never reach the app's real ones
+    configure_search_cache()
+    configure_response_cache()
+    configure_stream_cache()
+    configure_ingest_catalog()
+    backend = FakeBackend(latency=latency, jitter=jitter, error_rate=error_rate, seed=seed)
+    coll = FakeCollection(backend)
+    video = coll.add_video()
+    video.indexed = True
+    build_transcript_index(video)
+    llm = FakeLLM(backend, first_token=llm_latency)
+    # generous limits: the benchmark measures the pipeline, not the rate limiter
+    sched = LLMScheduler({"groq": llm}, ["groq"], {"groq": (100_000, 100_000_000, 8)})
+    use_cache = warm
+
+    def search(i):
+        vr = VideoRAG(video, collection=coll, use_cache=use_cache)
+        vr.search_video_content(QUESTIONS[i % len(QUESTIONS)], max_results=5)
+
+    def ask(i):
+        vr = VideoRAG(video, collection=coll, use_cache=use_cache)
+        question = QUESTIONS[i % len(QUESTIONS)]
+        segments = vr.search_video_content(question, max_results=5)
+        context = pack_context(segments, "groq", limit=3)
+        sched.answer(answer_prompt(question, context), priority=INTERACTIVE, use_cache=use_cache)
+
+    def quiz(i):
+        vr = VideoRAG(video, collection=coll, use_cache=use_cache)
+        segments = vr.search_video_content("main concepts", max_results=16)
+        quiz_map_reduce(sched, segments, 8, use_cache=use_cache)
+
+    def reel(i):
+        if not warm:
+            get_stream_cache().clear()
+        vr = VideoRAG(video, collection=coll, use_cache=use_cache)
+        build_reel(vr, REEL_TOPICS, per_topic=3)
+
+    def ingest(i):
+        # a new source each time so the ingest catalog does not short-circuit it
+        vid, _ = upload_video_any(coll, url=f"https://www.youtube.com/watch?v=bench{i:06d}")
+        ensure_index_spoken(vid)
+        build_transcript_index(vid)
+
+    pipelines = [("search", search), ("ask", ask), ("quiz", quiz), ("reel", reel), ("ingest", ingest)]
+    return [run_pipeline(name, backend, iterations, fn) for name, fn in pipelines]
+
+
+def print_report(results: List[Dict]):
+    header = (
+        f"{'pipeline':<10}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}"
+        f"{'calls/it':>10}{'errors':>8}{'peak KB':>10}"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['pipeline']:<10}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['mean_ms']:>10}"
+            f"{r['calls_per_iter']:>10}{r['errors']:>8}{r['peak_kb']:>10}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline VideoRAG benchmarks")
+    parser.add_argument("--latency", type=float, default=0.05, help="base seconds per fake VideoDB call")
+    parser.add_argument("--jitter", type=float, default=0.02, help="extra random seconds per call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls that fail")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds to first LLM token")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--warm", action="store_true", help="keep search, answer and stream caches on")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    results = run(args.latency, args.jitter, args.error_rate, args.iterations, args.warm,
+                  args.llm_latency, args.seed)
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
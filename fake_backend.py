@@ -0,0 +1,243 @@
+"""Local stand-ins for the videodb SDK and an LLM client, for benchmarks and load tests.
+
+Calls sleep for a configurable latency, fail at a configurable rate and are
+counted per method so pipelines can be compared without live keys.
+"""
+import itertools
+import random
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+CANNED_SENTENCES = [
+    "Welcome to this lecture, today we give an overview of gradient descent.",
+    "The main idea is to follow the negative gradient of the loss.",
+    "For example, consider a simple bowl shaped function.",
+    "A key concept here is the learning rate and how it controls the step size.",
+    "By definition the gradient points in the direction of steepest ascent.",
+    "Let us look at a demonstration with a small neural network.",
+    "In summary, choose the learning rate carefully and monitor the loss.",
+    "Another example is stochastic gradient descent on mini batches.",
+    "The core idea of momentum is to smooth the updates over time.",
+    "This case study shows training diverging when the rate is too high.",
+]
+
+
+class FakeStats:
+    def __init__(self):
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def count(self, name: str):
+        with self._lock:
+            self.calls[name] += 1
+
+    def total(self) -> int:
+        with self._lock:
+            return sum(self.calls.values())
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+
+
+class FakeBackend:
+    """Shared latency/error settings and call counters for all fake objects."""
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.02, error_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.stats = FakeStats()
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def call(self, name: str, latency: Optional[float] = None):
+        self.stats.count(name)
+        with self._rng_lock:
+            delay = (self.latency if latency is None else latency) + self._rng.uniform(0, self.jitter)
+            fail = self._rng.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            raise RuntimeError(f"fake transient error in {name}")
+
+
+def canned_transcript(duration: float = 1800.0, words_per_sec: float = 2.5) -> List[Dict]:
+    words, t = [], 0.0
+    step = 1.0 / words_per_sec
+    for sentence in itertools.cycle(CANNED_SENTENCES):
+        for w in sentence.split():
+            if t >= duration:
+                return words
+            words.append({"start": round(t, 2), "end": round(t + step * 0.9, 2), "text": w})
+            t += step
+    return words
+
+
+class FakeShot:
+    def __init__(self, video_id: str, start: float, end: float, text: str, score: float):
+        self.video_id = video_id
+        self.start = start
+        self.end = end
+        self.text = text
+        self.search_score = score
+
+
+class FakeSearchResult:
+    def __init__(self, shots: List[FakeShot]):
+        self.shots = shots
+
+    def get_shots(self):
+        return self.shots
+
+
+class FakeVideo:
+    def __init__(self, backend: FakeBackend, video_id: str, duration: float = 1800.0, window: float = 30.0):
+        self._backend = backend
+        self.id = video_id
+        self.length = duration
+        self.transcript = canned_transcript(duration)
+        self._windows = []
+        for w in range(0, int(duration), int(window)):
+            text = " ".join(x["text"] for x in self.transcript if w <= x["start"] < w + window)
+            self._windows.append((float(w), float(w + window), text, set(_TOKEN_RE.findall(text.lower()))))
+        self.indexed = False
+
+    def index_spoken_words(self, *args, **kwargs):
+        self._backend.call("video.index_spoken_words", latency=self._backend.latency * 4)
+        if self.indexed:
+            raise RuntimeError("Spoken word index already exists")
+        self.indexed = True
+
+    def get_transcript(self, *args, **kwargs):
+        self._backend.call("video.get_transcript")
+        return self.transcript
+
+    def get_transcript_text(self, *args, **kwargs):
+        self._backend.call("video.get_transcript_text")
+        return " ".join(w["text"] for w in self.transcript)
+
+    def _match(self, query: str, top_k: int) -> List[FakeShot]:
+        terms = set(_TOKEN_RE.findall(query.lower()))
+        scored = []
+        for start, end, text, tokens in self._windows:
+            overlap = len(terms & tokens)
+            if overlap:
+                scored.append((overlap / max(len(terms), 1), start, end, text))
+        scored.sort(key=lambda x: (-x[0], x[1]))
+        return [FakeShot(self.id, s, e, t, round(score, 3)) for score, s, e, t in scored[:top_k]]
+
+    def search(self, query: str, search_type=None, index_type=None, top_k: int = 10, **kwargs):
+        self._backend.call("video.search")
+        shots = self._match(query, top_k)
+        if not shots:
+            raise RuntimeError("No results found")
+        return FakeSearchResult(shots)
+
+    def generate_stream(self, timeline=None):
+        self._backend.call("video.generate_stream")
+        spans = ",".join(f"{a}-{b}" for a, b in (timeline or []))
+        return f"https://fake.videodb.local/{self.id}/stream.m3u8?t={spans}"
+
+
+class FakeCollection:
+    def __init__(self, backend: FakeBackend, collection_id: str = "c-fake", name: str = "fake"):
+        self._backend = backend
+        self.id = collection_id
+        self.name = name
+        self._videos: Dict[str, FakeVideo] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def add_video(self, duration: float = 1800.0) -> FakeVideo:
+        with self._lock:
+            video = FakeVideo(self._backend, f"m-fake-{next(self._ids)}", duration=duration)
+            self._videos[video.id] = video
+        return video
+
+    def upload(self, source=None, url=None, file_path=None, **kwargs):
+        self._backend.call("collection.upload", latency=self._backend.latency * 10)
+        return self.add_video()
+
+    def get_video(self, video_id: str):
+        self._backend.call("collection.get_video")
+        try:
+            return self._videos[video_id]
+        except KeyError:
+            raise RuntimeError(f"Video {video_id} not found")
+
+    def get_videos(self):
+        self._backend.call("collection.get_videos")
+        return list(self._videos.values())
+
+    def search(self, query: str, top_k: int = 10, **kwargs):
+        self._backend.call("collection.search")
+        shots = []
+        for video in list(self._videos.values()):
+            shots += video._match(query, top_k)
+        shots.sort(key=lambda s: -s.search_score)
+        if not shots:
+            raise RuntimeError("No results found")
+        return FakeSearchResult(shots[:top_k])
+
+
+class FakeConnection:
+    def __init__(self, backend: FakeBackend):
+        self._backend = backend
+        self._collections: Dict[str, FakeCollection] = {}
+
+    def get_collection(self, name: str = "default"):
+        self._backend.call("conn.get_collection")
+        if name not in self._collections:
+            raise RuntimeError(f"Collection {name} not found")
+        return self._collections[name]
+
+    def create_collection(self, name: str, description: str = ""):
+        self._backend.call("conn.create_collection")
+        coll = FakeCollection(self._backend, collection_id=f"c-{name}", name=name)
+        self._collections[name] = coll
+        return coll
+
+
+# Groq-shaped client, so it runs through LLMScheduler with provider="groq".
+class _Obj:
+    def __init__(self, **kw):
+        self.__dict__.update(kw)
+
+
+class FakeLLM:
+    def __init__(self, backend: FakeBackend, first_token: float = 0.2, per_token: float = 0.005,
+                 answer_tokens: int = 60):
+        self._backend = backend
+        self.first_token = first_token
+        self.per_token = per_token
+        self.answer_tokens = answer_tokens
+        self.chat = _Obj(completions=_Obj(create=self._create))
+
+    def _words(self, prompt: str) -> List[str]:
+        words = _TOKEN_RE.findall(prompt.lower())[-self.answer_tokens:]
+        return words or ["ok"]
+
+    def _create(self, messages=None, model=None, temperature=None, stream=False, **kwargs):
+        prompt = " ".join(m.get("content", "") for m in (messages or []))
+        self._backend.call("llm.create", latency=self.first_token)
+        words = self._words(prompt)
+        if not stream:
+            time.sleep(self.per_token * len(words))
+            return _Obj(choices=[_Obj(message=_Obj(content=" ".join(words)))])
+        return self._stream(words)
+
+    def _stream(self, words: List[str]):
+        for w in words:
+            time.sleep(self.per_token)
+            yield _Obj(choices=[_Obj(delta=_Obj(content=w + " "))])
+
+
+def fake_connect(backend: Optional[FakeBackend] = None, **kwargs) -> FakeConnection:
+    return FakeConnection(backend or FakeBackend(**kwargs))
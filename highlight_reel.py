@@ -0,0 +1,78 @@
+import copy
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from segment_store import SegmentStore
+from ttl_cache import TTLCache
+
+# Separate from the search pool: each topic search fans out into that one.
+_REEL_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="videorag-reel")
+
+
+def search_topics(vr, topics: List[str], per_topic: int = 3) -> SegmentStore:
+    topics = [t.strip() for t in topics if t and t.strip()]
+    if not topics:
+        return SegmentStore.empty()
+    # build the local index once, then give each topic its own copy so the
+    # lazy property and last_plan aren't shared between threads
+    vr.local_index
+    rags = [copy.copy(vr) for _ in topics]
+    results = list(_REEL_POOL.map(lambda r, t: r.search_store(t, max_results=per_topic), rags, topics))
+    vr.last_plan = {"topics": {t: r.last_plan for t, r in zip(topics, rags)}}
+    return SegmentStore.concat(results)
+
+
+def timeline_key(video_id, timeline: List[Tuple[int, int]]) -> Tuple:
+    return (str(video_id), ",".join(f"{a}-{b}" for a, b in timeline))
+
+
+class StreamCache(TTLCache):
+    """generate_stream URLs keyed by timeline_key(); invalidate(video_id) drops a video's reels."""
+
+    table = "stream_cache"
+
+
+_STREAMS: Optional[StreamCache] = None
+_STREAMS_LOCK = threading.Lock()
+
+
+def configure_stream_cache(max_entries: int = 512, ttl: float = 6 * 3600, path: Optional[str] = None) -> StreamCache:
+    global _STREAMS
+    with _STREAMS_LOCK:
+        _STREAMS = StreamCache(max_entries=max_entries, ttl=ttl, path=path)
+        return _STREAMS
+
+
+def get_stream_cache() -> StreamCache:
+    global _STREAMS
+    with _STREAMS_LOCK:
+        if _STREAMS is None:
+            # stream URLs are stable for a while, but not forever
+            _STREAMS = StreamCache(max_entries=512, ttl=6 * 3600,
+                                   path=os.getenv("VIDEORAG_CACHE_PATH") or None)
+        return _STREAMS
+
+
+def generate_stream_cached(video, timeline: List[Tuple[int, int]]) -> Optional[str]:
+    cache = get_stream_cache()
+    key = timeline_key(video.id, timeline)
+    url = cache.get(key)
+    if url:
+        return url
+    try:
+        url = video.generate_stream(timeline=timeline)
+    except Exception as e:
+        print(f"Stream warn: {e}")
+        return None
+    if url:
+        cache.set(key, url)
+    return url
+
+
+def build_reel(vr, topics: List[str], per_topic: int = 3, gap: float = 1.0, stream: bool = True) -> Dict:
+    store = search_topics(vr, topics, per_topic=per_topic)
+    timeline = store.merged_timeline(gap)
+    stream_url = generate_stream_cached(vr.video, timeline) if (stream and timeline) else None
+    return {"segments": store.to_dicts(), "timeline": timeline, "stream_url": stream_url}
@@ -0,0 +1,146 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from typing import List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+_YT_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")
+
+
+def youtube_id(url: str) -> Optional[str]:
+    try:
+        parsed = urlparse(url.strip())
+    except Exception:
+        return None
+    host = (parsed.netloc or "").lower().split(":")[0]
+    if host.startswith("www.") or host.startswith("m."):
+        host = host.split(".", 1)[1]
+    vid = None
+    if host == "youtu.be":
+        vid = parsed.path.lstrip("/").split("/")[0]
+    elif host in ("youtube.com", "music.youtube.com", "youtube-nocookie.com"):
+        if parsed.path == "/watch":
+            vid = parse_qs(parsed.query).get("v", [None])[0]
+        else:
+            parts = parsed.path.strip("/").split("/")
+            if len(parts) >= 2 and parts[0] in ("shorts", "embed", "live", "v"):
+                vid = parts[1]
+    if vid and _YT_ID_RE.match(vid):
+        return vid
+    return None
+
+
+def source_key_for_url(url: str) -> str:
+    vid = youtube_id(url)
+    if vid:
+        return f"yt:{vid}"
+    return f"url:{url.strip()}"
+
+
+def source_key_for_file(file, chunk_size: int = 8 * 1024 * 1024) -> str:
+    # Hash in chunks so large uploads never sit in memory, then rewind for the upload.
+    h = hashlib.sha256()
+    if hasattr(file, "seek"):
+        file.seek(0)
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        h.update(chunk)
+    if hasattr(file, "seek"):
+        file.seek(0)
+    return f"sha256:{h.hexdigest()}"
+
+
+class IngestCatalog:
+    """Maps source keys (YouTube id or file hash) to VideoDB video ids per collection."""
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS ingest_catalog ("
+            "collection_id TEXT, source_key TEXT, video_id TEXT, indexed INTEGER DEFAULT 0, "
+            "PRIMARY KEY (collection_id, source_key))"
+        )
+        self._db.commit()
+
+    def lookup(self, collection_id: str, source_key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT video_id FROM ingest_catalog WHERE collection_id = ? AND source_key = ?",
+                (collection_id, source_key),
+            ).fetchone()
+        return row[0] if row else None
+
+    def record(self, collection_id: str, source_key: str, video_id: str):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO ingest_catalog (collection_id, source_key, video_id, indexed) "
+                "VALUES (?, ?, ?, 0)",
+                (collection_id, source_key, video_id),
+            )
+            self._db.commit()
+
+    def forget(self, collection_id: str, source_key: str):
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM ingest_catalog WHERE collection_id = ? AND source_key = ?",
+                (collection_id, source_key),
+            )
+            self._db.commit()
+
+    def mark_indexed(self, video_id: str):
+        with self._lock:
+            self._db.execute("UPDATE ingest_catalog SET indexed = 1 WHERE video_id = ?", (video_id,))
+            self._db.commit()
+
+    def is_indexed(self, video_id: str) -> bool:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM ingest_catalog WHERE video_id = ? AND indexed = 1", (video_id,)
+            ).fetchone()
+        return row is not None
+
+    def rows(self, collection_id: str) -> List[Tuple[str, str, int]]:
+        """(source_key, video_id, indexed) for every entry of a collection."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT source_key, video_id, indexed FROM ingest_catalog WHERE collection_id = ?",
+                (collection_id,),
+            ).fetchall()
+
+    def restore(self, collection_id: str, rows: List[Tuple[str, str, int]]):
+        # never downgrade an entry this process has already seen indexed
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO ingest_catalog (collection_id, source_key, video_id, indexed) "
+                "VALUES (?, ?, ?, ?) ON CONFLICT (collection_id, source_key) DO UPDATE SET "
+                "indexed = CASE WHEN video_id = excluded.video_id THEN MAX(indexed, excluded.indexed) "
+                "ELSE excluded.indexed END, video_id = excluded.video_id",
+                [(collection_id, k, v, int(i)) for k, v, i in rows],
+            )
+            self._db.commit()
+
+
+_CATALOG: Optional[IngestCatalog] = None
+_CATALOG_LOCK = threading.Lock()
+
+
+def configure_ingest_catalog(path: str = ":memory:") -> IngestCatalog:
+    global _CATALOG
+    with _CATALOG_LOCK:
+        _CATALOG = IngestCatalog(path)
+        return _CATALOG
+
+
+def get_ingest_catalog() -> IngestCatalog:
+    global _CATALOG
+    with _CATALOG_LOCK:
+        if _CATALOG is None:
+            # set VIDEORAG_CATALOG_PATH to remember ingests across restarts
+            _CATALOG = IngestCatalog(os.getenv("VIDEORAG_CATALOG_PATH") or ":memory:")
+        return _CATALOG
@@ -0,0 +1,161 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from ingest_catalog import source_key_for_file, source_key_for_url
+from transcript_index import get_transcript_index
+from videodb_utils import ensure_index_spoken, remember_video, upload_video_any
+from videorag import warm_video_cache
+
+QUEUED = "queued"
+UPLOADING = "uploading"
+INDEXING = "indexing"
+DONE = "done"
+FAILED = "failed"
+
+# one thread for all collections: warming is a nicety and must not compete with
+# ingests or with live searches in the shared search pool
+_WARM_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-warm")
+
+
+class IngestJob:
+    def __init__(self, url: Optional[str] = None, file=None):
+        # unique across API workers, so a poll on the wrong worker is a 404, not another job
+        self.id = f"job-{uuid.uuid4().hex}"
+        self.url = url
+        self.file = file
+        self.source = url or getattr(file, "name", "upload")
+        self.state = QUEUED
+        self.progress = 0.0
+        self.video_id: Optional[str] = None
+        self.video_url: Optional[str] = None
+        self.error: Optional[str] = None
+        # set once the canned searches for the new video are cached
+        self.warmed = False
+        self.created = time.time()
+        self.finished: Optional[float] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "source": self.source,
+            "state": self.state,
+            "progress": round(self.progress, 2),
+            "video_id": self.video_id,
+            "warmed": self.warmed,
+            "error": self.error,
+        }
+
+
+class IngestScheduler:
+    """Runs upload + index jobs for one collection on a small pool of worker threads."""
+
+    def __init__(self, collection, max_workers: int = 2, warm: bool = True):
+        self.collection = collection
+        self.max_workers = max_workers
+        # pre-run the canned searches so a new video's first questions hit the cache
+        self.warm = warm
+        self._jobs: Dict[str, IngestJob] = {}
+        self._queue: "queue.Queue[IngestJob]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"ingest-{i}", daemon=True)
+            for i in range(max_workers)
+        ]
+        for t in self._workers:
+            t.start()
+
+    def submit(self, urls: Optional[List[str]] = None, files: Optional[List] = None) -> List[str]:
+        # the same video twice in one batch is one job
+        sources = [(source_key_for_url(u), IngestJob(url=u.strip())) for u in (urls or []) if u and u.strip()]
+        sources += [(source_key_for_file(f), IngestJob(file=f)) for f in (files or []) if f is not None]
+        jobs = list({key: job for key, job in reversed(sources)}.values())[::-1]
+        with self._lock:
+            for job in jobs:
+                self._jobs[job.id] = job
+        for job in jobs:
+            self._queue.put(job)
+        return [job.id for job in jobs]
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self, job_ids: Optional[List[str]] = None) -> List[IngestJob]:
+        with self._lock:
+            if job_ids is None:
+                return list(self._jobs.values())
+            return [self._jobs[j] for j in job_ids if j in self._jobs]
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if j.state not in (DONE, FAILED))
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job: IngestJob):
+        def on_progress(done, total):
+            if total:
+                job.progress = min(done / total, 1.0)
+
+        try:
+            job.state = UPLOADING
+            video, working_url = upload_video_any(
+                self.collection, url=job.url, file=job.file, progress=on_progress
+            )
+            if not video:
+                raise RuntimeError("Upload failed. Try another URL or file.")
+            remember_video(self.collection, video)
+            job.video_id = video.id
+            job.video_url = working_url
+            job.progress = 1.0
+
+            job.state = INDEXING
+            ensure_index_spoken(video)
+            get_transcript_index(video)
+            # usable now; warming runs afterwards in the background
+            job.state = DONE
+            if self.warm:
+                _WARM_POOL.submit(self._warm, job, video)
+        except Exception as e:
+            job.error = str(e)
+            job.state = FAILED
+        finally:
+            # the upload buffer is no longer needed once the job settles
+            job.file = None
+            job.finished = time.time()
+
+    @staticmethod
+    def _warm(job: IngestJob, video):
+        try:
+            warm_video_cache(video)
+            job.warmed = True
+        except Exception as e:
+            print(f"Warm warn: {e}")
+
+
+_SCHEDULERS: Dict[str, IngestScheduler] = {}
+_SCHEDULERS_LOCK = threading.Lock()
+
+
+def get_ingest_scheduler(collection, max_workers: Optional[int] = None, warm: Optional[bool] = None) -> IngestScheduler:
+    if max_workers is None:
+        max_workers = int(os.getenv("VIDEORAG_INGEST_WORKERS", "2"))
+    if warm is None:
+        warm = os.getenv("VIDEORAG_WARM_CACHE", "1") not in ("", "0", "false")
+    with _SCHEDULERS_LOCK:
+        sched = _SCHEDULERS.get(collection.id)
+        if sched is None:
+            sched = IngestScheduler(collection, max_workers=max_workers, warm=warm)
+            _SCHEDULERS[collection.id] = sched
+        return sched
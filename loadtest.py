@@ -0,0 +1,58 @@
+"""Concurrent load test for api.py.
+
+    VIDEORAG_FAKE_BACKEND=1 uvicorn api:app --workers 2 &
+    python loadtest.py --users 50 --requests 500
+"""
+import argparse
+import asyncio
+import itertools
+import time
+
+import httpx
+
+from benchmark import QUESTIONS, percentile
+
+
+async def run(url: str, users: int, requests: int, endpoint: str):
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        videos = (await client.get("/videos")).json()["videos"]
+        if not videos:
+            raise SystemExit("No videos in the collection; ingest one first.")
+        counter = itertools.count()
+        latencies, errors = [], 0
+
+        async def user():
+            nonlocal errors
+            while True:
+                i = next(counter)
+                if i >= requests:
+                    return
+                body = {"video_id": videos[i % len(videos)], "question": QUESTIONS[i % len(QUESTIONS)]}
+                t0 = time.perf_counter()
+                try:
+                    resp = await client.post(endpoint, json=body)
+                    resp.raise_for_status()
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(users)))
+        elapsed = time.perf_counter() - t0
+
+    print(f"{requests} requests, {users} users, {elapsed:.1f}s, {requests / elapsed:.1f} req/s, {errors} errors")
+    print(f"p50 {percentile(latencies, 50) * 1000:.1f} ms, p95 {percentile(latencies, 95) * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the VideoRAG HTTP API")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=20, help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--endpoint", default="/search", choices=["/search", "/answer"])
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.users, args.requests, args.endpoint))
+
+
+if __name__ == "__main__":
+    main()
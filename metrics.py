@@ -0,0 +1,146 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        # upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+
+class Metrics:
+    """Span timings aggregated into histograms, keyed by span name and labels."""
+
+    def __init__(self):
+        self._hists: Dict[Tuple, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name,) + tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            hist = self._hists.get(key)
+            if hist is None:
+                hist = self._hists[key] = Histogram()
+            hist.observe(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._hists.clear()
+
+    def summary(self) -> List[Dict]:
+        with self._lock:
+            items = sorted(self._hists.items())
+            return [
+                {
+                    "span": key[0],
+                    "labels": ",".join(f"{k}={v}" for k, v in key[1:]),
+                    "count": h.count,
+                    "mean_ms": round(1000 * h.total / h.count, 1) if h.count else 0.0,
+                    "p50_ms": round(1000 * h.quantile(0.5), 1),
+                    "p95_ms": round(1000 * h.quantile(0.95), 1),
+                }
+                for key, h in items
+            ]
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# HELP videorag_span_seconds Time spent in VideoRAG remote calls and pipeline stages.",
+            "# TYPE videorag_span_seconds histogram",
+        ]
+        with self._lock:
+            for key, h in sorted(self._hists.items()):
+                labels = [("span", key[0])] + list(key[1:])
+                base = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+                cumulative = 0
+                for bound, c in zip(h.buckets, h.counts):
+                    cumulative += c
+                    lines.append(f'videorag_span_seconds_bucket{{{base},le="{bound}"}} {cumulative}')
+                lines.append(f'videorag_span_seconds_bucket{{{base},le="+Inf"}} {h.count}')
+                lines.append(f"videorag_span_seconds_sum{{{base}}} {h.total:.6f}")
+                lines.append(f"videorag_span_seconds_count{{{base}}} {h.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+METRICS = Metrics()
+
+
+@contextmanager
+def span(name: str, benign: Tuple[str, ...] = (), **labels):
+    """Time a block; status is ok, error, or empty when the error message matches benign."""
+    t0 = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except Exception as e:
+        status = "empty" if any(b in str(e) for b in benign) else "error"
+        raise
+    finally:
+        METRICS.observe(name, time.perf_counter() - t0, status=status, **labels)
+
+
+def render_prometheus() -> str:
+    return METRICS.render_prometheus()
+
+
+def dump_metrics(path: str):
+    with open(path, "w") as f:
+        f.write(render_prometheus())
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_SERVER: Optional[ThreadingHTTPServer] = None
+_SERVER_LOCK = threading.Lock()
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve /metrics in a background thread; safe to call on every Streamlit rerun."""
+    global _SERVER
+    with _SERVER_LOCK:
+        if _SERVER is None:
+            _SERVER = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_SERVER.serve_forever, name="metrics", daemon=True).start()
+        return _SERVER
@@ -0,0 +1,129 @@
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable
+
+# Errors that mean "nothing there" or a bad request; retrying them never helps.
+PERMANENT_MARKERS = ("no results found", "not found", "invalid", "unauthorized", "forbidden", "already")
+TRANSIENT_MARKERS = (
+    "timeout", "timed out", "temporarily", "unavailable", "connection", "reset by peer",
+    "too many requests", "rate limit", "429", "500", "502", "503", "504", "transient",
+)
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+def is_transient(e: Exception) -> bool:
+    if isinstance(e, CircuitOpenError):
+        return False
+    if isinstance(e, (TimeoutError, ConnectionError)):
+        return True
+    msg = f"{type(e).__name__} {e}".lower()
+    if any(m in msg for m in PERMANENT_MARKERS):
+        return False
+    return any(m in msg for m in TRANSIENT_MARKERS)
+
+
+def retry(fn: Callable, attempts: int = 3, base_delay: float = 0.2, max_delay: float = 2.0,
+          should_retry: Callable[[Exception], bool] = is_transient):
+    """Call fn, retrying transient errors with full-jitter exponential backoff."""
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == attempts - 1 or not should_retry(e):
+                raise
+            time.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
+
+
+class CircuitBreaker:
+    """Fails fast after repeated transient failures, then lets one probe call through."""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.failures < self.failure_threshold:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def _before(self):
+        with self._lock:
+            if self.failures < self.failure_threshold:
+                return
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._probing:
+                raise CircuitOpenError(f"{self.name} circuit open after {self.failures} failures")
+            self._probing = True
+
+    def _after(self, error: Exception = None):
+        with self._lock:
+            self._probing = False
+            if error is None:
+                self.failures = 0
+            elif is_transient(error):
+                self.failures += 1
+                if self.failures >= self.failure_threshold:
+                    self.opened_at = time.monotonic()
+
+    def call(self, fn: Callable):
+        self._before()
+        try:
+            result = fn()
+        except Exception as e:
+            self._after(e)
+            raise
+        self._after()
+        return result
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one execution and its result or error."""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable):
+        with self._lock:
+            fut = self._inflight.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._inflight[key] = Future()
+            else:
+                self.shared += 1
+        if not leader:
+            return fut.result()
+        try:
+            result = fn()
+        except Exception as e:
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+
+VIDEODB_BREAKER = CircuitBreaker("videodb")
+VIDEODB_FLIGHTS = SingleFlight()
+
+
+def videodb_call(key: Hashable, fn: Callable):
+    """Coalesce identical in-flight calls, then retry transient errors behind the breaker."""
+    return VIDEODB_FLIGHTS.do(key, lambda: VIDEODB_BREAKER.call(lambda: retry(fn)))
@@ -0,0 +1,43 @@
+import hashlib
+import os
+import re
+import threading
+from typing import Optional, Tuple
+
+from ttl_cache import TTLCache
+
+_WS_RE = re.compile(r"\s+")
+
+
+def prompt_key(provider: str, model: str, prompt: str) -> Tuple:
+    normalized = _WS_RE.sub(" ", prompt or "").strip()
+    digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+    return (provider, model, digest)
+
+
+class ResponseCache(TTLCache):
+    """LLM completions keyed by prompt_key(); invalidate(provider) drops a provider's entries."""
+
+    table = "response_cache"
+
+
+_CACHE: Optional[ResponseCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def configure_response_cache(max_entries: int = 1024, ttl: float = 7 * 24 * 3600,
+                             path: Optional[str] = None) -> ResponseCache:
+    global _CACHE
+    with _CACHE_LOCK:
+        _CACHE = ResponseCache(max_entries=max_entries, ttl=ttl, path=path)
+        return _CACHE
+
+
+def get_response_cache() -> ResponseCache:
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            # set VIDEORAG_LLM_CACHE_PATH to keep answers across restarts
+            _CACHE = ResponseCache(max_entries=1024, ttl=7 * 24 * 3600,
+                                   path=os.getenv("VIDEORAG_LLM_CACHE_PATH") or None)
+        return _CACHE
@@ -0,0 +1,35 @@
+import os
+import threading
+from typing import Optional, Tuple
+
+from ttl_cache import TTLCache
+
+
+def cache_key(video_id, query: str, search_type, index_type, top_k: int) -> Tuple:
+    return (str(video_id), query.strip().lower(), str(search_type), str(index_type), int(top_k))
+
+
+class SearchCache(TTLCache):
+    """SegmentStore.to_json() columns keyed by cache_key(); invalidate(video_id) drops a video's entries."""
+
+    table = "search_cache"
+
+
+_CACHE: Optional[SearchCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def configure_search_cache(max_entries: int = 2048, ttl: float = 24 * 3600, path: Optional[str] = None) -> SearchCache:
+    global _CACHE
+    with _CACHE_LOCK:
+        _CACHE = SearchCache(max_entries=max_entries, ttl=ttl, path=path)
+        return _CACHE
+
+
+def get_search_cache() -> SearchCache:
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            # set VIDEORAG_CACHE_PATH to keep results across Streamlit restarts
+            _CACHE = SearchCache(path=os.getenv("VIDEORAG_CACHE_PATH") or None)
+        return _CACHE
@@ -0,0 +1,182 @@
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+
+def _score(raw) -> float:
+    try:
+        return float(raw)
+    except Exception:
+        return 0.0
+
+
+class SegmentStore:
+    """Columnar segments: NumPy arrays for times and scores, dicts built only on demand.
+
+    Row order is preserved by every operation that doesn't say it sorts.
+    """
+
+    __slots__ = ("start", "end", "score", "video", "texts", "video_ids")
+
+    def __init__(self, start, end, score, texts: List[str], video=None, video_ids: Optional[List] = None):
+        self.start = np.asarray(start, dtype=np.float64)
+        self.end = np.asarray(end, dtype=np.float64)
+        self.score = np.asarray(score, dtype=np.float32)
+        self.texts = list(texts)
+        # video ids are interned: `video` holds an index into `video_ids` per row
+        self.video_ids = list(video_ids or [None])
+        self.video = (
+            np.zeros(len(self.start), dtype=np.int32) if video is None else np.asarray(video, dtype=np.int32)
+        )
+
+    @classmethod
+    def empty(cls) -> "SegmentStore":
+        return cls([], [], [], [])
+
+    @classmethod
+    def from_shots(cls, shots: Iterable, text_chars: int = 220) -> "SegmentStore":
+        starts, ends, scores, texts, vids = [], [], [], [], []
+        ids: Dict = {}
+        for s in shots:
+            start = getattr(s, "start", 0)
+            starts.append(start)
+            ends.append(getattr(s, "end", start + 30))
+            scores.append(_score(getattr(s, "search_score", getattr(s, "score", 0.0))))
+            texts.append((getattr(s, "text", "") or "").strip()[:text_chars])
+            vids.append(ids.setdefault(getattr(s, "video_id", None), len(ids)))
+        score = np.asarray(scores, dtype=np.float32)
+        # remote scores come as 0..1 or already as percentages
+        score = np.where(score <= 1, score * 100, score).round(1)
+        return cls(starts, ends, score, texts, vids, list(ids) or [None])
+
+    @classmethod
+    def from_segments(cls, segments: Iterable[Dict]) -> "SegmentStore":
+        segments = list(segments)
+        ids: Dict = {}
+        vids = [ids.setdefault(s.get("video_id"), len(ids)) for s in segments]
+        return cls(
+            [s["start_time"] for s in segments],
+            [s["end_time"] for s in segments],
+            [s.get("score", 0.0) for s in segments],
+            [s.get("text", "") for s in segments],
+            vids,
+            list(ids) or [None],
+        )
+
+    @classmethod
+    def concat(cls, stores: List["SegmentStore"]) -> "SegmentStore":
+        stores = [s for s in stores if len(s)]
+        if not stores:
+            return cls.empty()
+        ids: Dict = {}
+        videos = []
+        for st in stores:
+            remap = np.array([ids.setdefault(v, len(ids)) for v in st.video_ids], dtype=np.int32)
+            videos.append(remap[st.video])
+        return cls(
+            np.concatenate([s.start for s in stores]),
+            np.concatenate([s.end for s in stores]),
+            np.concatenate([s.score for s in stores]),
+            [t for s in stores for t in s.texts],
+            np.concatenate(videos),
+            list(ids),
+        )
+
+    @classmethod
+    def from_json(cls, value) -> "SegmentStore":
+        if isinstance(value, list):
+            # cache entries written as lists of dicts before the columnar format
+            return cls.from_segments(value)
+        return cls(value["start"], value["end"], value["score"], value["texts"], value["video"], value["video_ids"])
+
+    def to_json(self) -> Dict:
+        """JSON-able columns, for caches and snapshots."""
+        return {
+            "start": self.start.tolist(),
+            "end": self.end.tolist(),
+            "score": self.score.tolist(),
+            "texts": list(self.texts),
+            "video": self.video.tolist(),
+            "video_ids": list(self.video_ids),
+        }
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    def take(self, idx) -> "SegmentStore":
+        idx = np.asarray(idx, dtype=np.intp)
+        return SegmentStore(
+            self.start[idx], self.end[idx], self.score[idx],
+            [self.texts[i] for i in idx], self.video[idx], self.video_ids,
+        )
+
+    def with_video_id(self, video_id) -> "SegmentStore":
+        return SegmentStore(self.start, self.end, self.score, self.texts, None, [video_id])
+
+    def head(self, n: int) -> "SegmentStore":
+        return self.take(np.arange(min(n, len(self))))
+
+    def dedupe(self) -> "SegmentStore":
+        # same rule as the dict pipeline: same video and whole-second start, first row wins
+        if not len(self):
+            return self
+        keys = self.video.astype(np.int64) << 32 | self.start.astype(np.int64)
+        _, first = np.unique(keys, return_index=True)
+        return self.take(np.sort(first))
+
+    def sort_by_start(self) -> "SegmentStore":
+        return self.take(np.argsort(self.start, kind="stable"))
+
+    def top_k(self, k: int) -> "SegmentStore":
+        if k >= len(self):
+            return self.take(np.argsort(-self.score, kind="stable"))
+        part = np.argpartition(-self.score, k - 1)[:k]
+        return self.take(part[np.argsort(-self.score[part], kind="stable")])
+
+    def between(self, t1: float, t2: float) -> "SegmentStore":
+        """Rows overlapping [t1, t2]."""
+        return self.take(np.flatnonzero((self.end >= t1) & (self.start <= t2)))
+
+    def overlap_groups(self, gap: float = 0.0) -> np.ndarray:
+        """Group id per row (in start order) for runs of overlapping or near-touching rows."""
+        if not len(self):
+            return np.zeros(0, dtype=np.int64)
+        order = np.argsort(self.start, kind="stable")
+        start, end = self.start[order], np.maximum(self.end[order], self.start[order])
+        reach = np.maximum.accumulate(end)
+        new_group = np.empty(len(start), dtype=bool)
+        new_group[0] = True
+        new_group[1:] = start[1:] > reach[:-1] + gap
+        groups = np.empty(len(start), dtype=np.int64)
+        groups[order] = np.cumsum(new_group) - 1
+        return groups
+
+    def merged_timeline(self, gap: float = 1.0) -> List[Tuple[int, int]]:
+        if not len(self):
+            return []
+        start = self.start.astype(np.int64)
+        end = np.maximum(self.end.astype(np.int64), start)
+        merged = SegmentStore(start, end, self.score, self.texts, self.video, self.video_ids)
+        groups = merged.overlap_groups(gap)
+        n = int(groups.max()) + 1
+        lo = np.full(n, np.iinfo(np.int64).max)
+        hi = np.full(n, np.iinfo(np.int64).min)
+        np.minimum.at(lo, groups, start)
+        np.maximum.at(hi, groups, end)
+        return [(int(a), int(b)) for a, b in zip(lo, hi)]
+
+    def iter_dicts(self, limit: Optional[int] = None) -> Iterator[Dict]:
+        n = len(self) if limit is None else min(limit, len(self))
+        for i in range(n):
+            start = float(self.start[i])
+            yield {
+                "start_time": int(start),
+                "end_time": int(self.end[i]),
+                "timestamp": f"{int(start//60):02d}:{int(start%60):02d}",
+                "text": self.texts[i],
+                "score": round(float(self.score[i]), 1),
+                "video_id": self.video_ids[int(self.video[i])],
+            }
+
+    def to_dicts(self, limit: Optional[int] = None) -> List[Dict]:
+        return list(self.iter_dicts(limit))
@@ -0,0 +1,280 @@
+"""Per-collection snapshots of transcripts, cached searches and the ingest catalog.
+
+A snapshot is a directory of append-only parts. Each part holds NumPy columns
+saved as .npy files (the .npz layout, unzipped so np.load can memory-map
+them) plus a small meta.json. Strings are stored as one UTF-8 byte column
+with offsets, so a transcript is decoded only when a video asks for it.
+
+    export_snapshot(coll)   # appends whatever is new since the last part
+    load_snapshot(coll.id)  # in a fresh process: warm without VideoDB calls
+"""
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from ingest_catalog import get_ingest_catalog
+from search_cache import get_search_cache
+from segment_store import SegmentStore
+from transcript_index import add_window_source, get_transcript_index
+from transcript_store import get_transcript_store
+from videodb_utils import list_videos
+
+_SAFE_RE = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def snapshot_dir(collection_id: str, root: Optional[str] = None) -> str:
+    # set VIDEORAG_SNAPSHOT_DIR to share snapshots between restarts and replicas
+    root = root or os.getenv("VIDEORAG_SNAPSHOT_DIR") or os.path.join(tempfile.gettempdir(), "videorag-snapshots")
+    return os.path.join(root, _SAFE_RE.sub("_", str(collection_id)))
+
+
+def _save_strings(path: str, name: str, strings: List[str]):
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    np.save(os.path.join(path, f"{name}.npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    np.save(os.path.join(path, f"{name}_offsets.npy"), offsets)
+
+
+class SnapshotPart:
+    """One part of a snapshot; columns are memory-mapped on first use."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        self.created: float = meta["created"]
+        # video id -> [first row, end row] in the transcript columns
+        self.transcripts: Dict[str, List[int]] = meta["transcripts"]
+        # [key, created, first row, end row] in the segment columns
+        self.cache: List[list] = meta["cache"]
+        self.segment_video_ids: List = meta["segment_video_ids"]
+        self.catalog: List[list] = meta["catalog"]
+        self._cols: Dict[str, np.ndarray] = {}
+
+    def col(self, name: str) -> np.ndarray:
+        arr = self._cols.get(name)
+        if arr is None:
+            arr = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+            self._cols[name] = arr
+        return arr
+
+    def strings(self, name: str, lo: int, hi: int) -> List[str]:
+        blob, offsets = self.col(name), self.col(f"{name}_offsets")
+        raw = bytes(blob[offsets[lo]:offsets[hi]])
+        base = int(offsets[lo])
+        return [raw[int(a) - base:int(b) - base].decode("utf-8") for a, b in zip(offsets[lo:hi], offsets[lo + 1:hi + 1])]
+
+    def windows(self, video_id: str) -> Optional[List[Dict]]:
+        rows = self.transcripts.get(video_id)
+        if rows is None:
+            return None
+        lo, hi = rows
+        starts, ends = self.col("transcript_start")[lo:hi], self.col("transcript_end")[lo:hi]
+        texts = self.strings("transcript_text", lo, hi)
+        return [{"start": float(s), "end": float(e), "text": t} for s, e, t in zip(starts, ends, texts)]
+
+    def segments(self, lo: int, hi: int) -> Dict:
+        return SegmentStore(
+            self.col("segment_start")[lo:hi],
+            self.col("segment_end")[lo:hi],
+            self.col("segment_score")[lo:hi],
+            self.strings("segment_text", lo, hi),
+            self.col("segment_video")[lo:hi],
+            self.segment_video_ids,
+        ).to_json()
+
+
+class CollectionSnapshot:
+    """All parts of one collection's snapshot, newest entries winning."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.parts: List[SnapshotPart] = []
+        # parts already restored into this process's catalog and search cache
+        self.loaded = 0
+        self.refresh()
+
+    def refresh(self):
+        with self._lock:
+            known = {p.path for p in self.parts}
+            names = sorted(n for n in os.listdir(self.path) if n.startswith("part-")) if os.path.isdir(self.path) else []
+            for name in names:
+                path = os.path.join(self.path, name)
+                if path not in known:
+                    self.parts.append(SnapshotPart(path))
+
+    def videos(self) -> set:
+        return {v for p in self.parts for v in p.transcripts}
+
+    def windows(self, video_id: str) -> Optional[List[Dict]]:
+        for part in reversed(self.parts):
+            windows = part.windows(video_id)
+            if windows is not None:
+                return windows
+        return None
+
+    def cache_entries(self, parts: Optional[List[SnapshotPart]] = None) -> Iterator[Tuple[Tuple, float, Dict]]:
+        latest: Dict[Tuple, Tuple[SnapshotPart, list]] = {}
+        for part in self.parts if parts is None else parts:
+            for entry in part.cache:
+                key = tuple(entry[0])
+                if key not in latest or entry[1] >= latest[key][1][1]:
+                    latest[key] = (part, entry)
+        for key, (part, (_, created, lo, hi)) in latest.items():
+            yield key, created, part.segments(lo, hi)
+
+    def cache_versions(self) -> Dict[Tuple, float]:
+        return {tuple(e[0]): e[1] for p in self.parts for e in p.cache}
+
+    def catalog_rows(self, parts: Optional[List[SnapshotPart]] = None) -> List[Tuple[str, str, int]]:
+        rows: Dict[str, Tuple[str, str, int]] = {}
+        for part in self.parts if parts is None else parts:
+            for source_key, video_id, indexed in part.catalog:
+                rows[source_key] = (source_key, video_id, indexed)
+        return list(rows.values())
+
+    def append(self, transcripts: Dict[str, List[Tuple[float, float, str]]],
+               cache: List[Tuple[Tuple, float, Dict]],
+               catalog: List[Tuple[str, str, int]]) -> Optional[str]:
+        """Write a new part; returns its path, or None when there is nothing to add."""
+        if not transcripts and not cache and not catalog:
+            return None
+        os.makedirs(self.path, exist_ok=True)
+        # time first so names sort in write order; the uuid keeps replicas sharing
+        # the directory from ever picking the same name
+        name = f"part-{time.time_ns():020d}-{uuid.uuid4().hex[:12]}"
+        path = os.path.join(self.path, name)
+        tmp = tempfile.mkdtemp(prefix=f".{name}-", dir=self.path)
+        try:
+            _write_part(tmp, transcripts, cache, catalog)
+            # the rename publishes the part; readers never see a half-written one
+            os.rename(tmp, path)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        with self._lock:
+            # everything in it came from this process, so there is nothing to load back
+            if self.loaded == len(self.parts):
+                self.loaded += 1
+            self.parts.append(SnapshotPart(path))
+        return path
+
+
+def _write_part(path: str, transcripts: Dict[str, List[Tuple[float, float, str]]],
+                cache: List[Tuple[Tuple, float, Dict]], catalog: List[Tuple[str, str, int]]):
+    t_rows, t_lines = {}, []
+    for video_id, lines in transcripts.items():
+        t_rows[video_id] = [len(t_lines), len(t_lines) + len(lines)]
+        t_lines += lines
+    np.save(os.path.join(path, "transcript_start.npy"), np.array([l[0] for l in t_lines], dtype=np.float64))
+    np.save(os.path.join(path, "transcript_end.npy"), np.array([l[1] for l in t_lines], dtype=np.float64))
+    _save_strings(path, "transcript_text", [l[2] for l in t_lines])
+
+    entries, stores, row = [], [], 0
+    for key, created, value in cache:
+        store = SegmentStore.from_json(value)
+        entries.append([list(key), created, row, row + len(store)])
+        stores.append(store)
+        row += len(store)
+    segs = SegmentStore.concat(stores)
+    np.save(os.path.join(path, "segment_start.npy"), segs.start)
+    np.save(os.path.join(path, "segment_end.npy"), segs.end)
+    np.save(os.path.join(path, "segment_score.npy"), segs.score)
+    np.save(os.path.join(path, "segment_video.npy"), segs.video)
+    _save_strings(path, "segment_text", segs.texts)
+
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump({
+            "created": time.time(),
+            "transcripts": t_rows,
+            "cache": entries,
+            "segment_video_ids": segs.video_ids,
+            "catalog": [list(r) for r in catalog],
+        }, f)
+
+
+_SNAPSHOTS: Dict[str, CollectionSnapshot] = {}
+_SNAPSHOTS_LOCK = threading.Lock()
+
+
+def get_snapshot(collection_id: str, root: Optional[str] = None) -> CollectionSnapshot:
+    path = snapshot_dir(collection_id, root)
+    with _SNAPSHOTS_LOCK:
+        snap = _SNAPSHOTS.get(path)
+        if snap is None:
+            snap = CollectionSnapshot(path)
+            _SNAPSHOTS[path] = snap
+            # transcripts stay on disk until a video needs its index or pages
+            add_window_source(snap.windows)
+        return snap
+
+
+def _video_lines(video) -> Optional[List[Tuple[float, float, str]]]:
+    # only what this process already holds; exporting never downloads transcripts
+    idx = get_transcript_index(video, build=False)
+    if idx is not None and len(idx):
+        return list(zip(idx.starts, idx.ends, idx.texts))
+    doc = get_transcript_store().get(video, fetch=False)
+    if doc is not None and doc.num_pages:
+        return list(doc.iter_lines())
+    return None
+
+
+def export_snapshot(collection, videos=None, root: Optional[str] = None) -> Dict:
+    """Append the collection's new transcripts, cached searches and catalog rows."""
+    snap = get_snapshot(collection.id, root)
+    snap.refresh()
+    videos = list_videos(collection) if videos is None else videos
+    video_ids = {str(v.id) for v in videos}
+
+    have = snap.videos()
+    transcripts = {}
+    for video in videos:
+        if str(video.id) in have:
+            continue
+        lines = _video_lines(video)
+        if lines:
+            transcripts[str(video.id)] = lines
+
+    groups = video_ids | {str(collection.id)}
+    versions = snap.cache_versions()
+    cache = [
+        (key, created, value)
+        for key, created, value in get_search_cache().items()
+        if str(key[0]) in groups and versions.get(tuple(key), -1) < created
+    ]
+
+    saved = {r[0]: tuple(r) for r in snap.catalog_rows()}
+    catalog = [tuple(r) for r in get_ingest_catalog().rows(collection.id) if saved.get(r[0]) != tuple(r)]
+
+    path = snap.append(transcripts, cache, catalog)
+    return {"part": path, "transcripts": len(transcripts), "searches": len(cache), "catalog": len(catalog)}
+
+
+def load_snapshot(collection_id: str, root: Optional[str] = None) -> Dict:
+    """Warm this process from a collection's snapshot; later calls only apply new parts."""
+    snap = get_snapshot(collection_id, root)
+    snap.refresh()
+    with snap._lock:
+        parts = snap.parts[snap.loaded:]
+        snap.loaded = len(snap.parts)
+    catalog = snap.catalog_rows(parts)
+    if catalog:
+        get_ingest_catalog().restore(collection_id, catalog)
+    cache = get_search_cache()
+    now = time.time()
+    searches = 0
+    for key, created, value in snap.cache_entries(parts):
+        if now - created <= cache.ttl:
+            cache.set(key, value, created=created)
+            searches += 1
+    return {"parts": len(parts), "transcripts": len(snap.videos()), "searches": searches, "catalog": len(catalog)}
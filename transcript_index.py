@@ -0,0 +1,177 @@
+import math
+import re
+import threading
+from array import array
+from collections import Counter
+from typing import Callable, List, Dict, Optional
+
+from metrics import span
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it",
+    "of", "on", "or", "that", "the", "this", "to", "was", "were", "with", "what", "how",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in _STOPWORDS]
+
+
+def transcript_windows(words: List[Dict], window: float = 30.0) -> List[Dict]:
+    # Group word-level timestamps into fixed windows, roughly the size of a search shot.
+    windows = []
+    cur_start, cur_end, cur_words = None, 0.0, []
+    for w in words or []:
+        text = (w.get("text") or "").strip()
+        if not text or text == "-":
+            continue
+        start = float(w.get("start", 0) or 0)
+        end = float(w.get("end", start) or start)
+        if cur_start is None:
+            cur_start = start
+        elif start - cur_start >= window:
+            windows.append({"start": cur_start, "end": cur_end, "text": " ".join(cur_words)})
+            cur_start, cur_words = start, []
+        cur_words.append(text)
+        cur_end = end
+    if cur_words:
+        windows.append({"start": cur_start, "end": cur_end, "text": " ".join(cur_words)})
+    return windows
+
+
+# Local copies of transcript windows (e.g. loaded snapshots), consulted before VideoDB.
+_WINDOW_SOURCES: List[Callable[[str], Optional[List[Dict]]]] = []
+
+
+def add_window_source(source: Callable[[str], Optional[List[Dict]]]):
+    if source not in _WINDOW_SOURCES:
+        _WINDOW_SOURCES.append(source)
+
+
+def stored_windows(video_id) -> Optional[List[Dict]]:
+    for source in list(_WINDOW_SOURCES):
+        windows = source(str(video_id))
+        if windows:
+            return windows
+    return None
+
+
+class TranscriptIndex:
+    """In-memory BM25 index over transcript windows."""
+
+    def __init__(self, windows: List[Dict], k1: float = 1.5, b: float = 0.75, window: float = 30.0):
+        self.k1 = k1
+        self.b = b
+        self.starts = array("d", (w["start"] for w in windows))
+        self.ends = array("d", (w["end"] for w in windows))
+        self.texts = [w["text"] for w in windows]
+        self.window = window
+        self.doc_len = array("I")
+        # term -> (doc ids, term frequencies), both compact typed arrays
+        self.postings: Dict[str, tuple] = {}
+        for doc_id, w in enumerate(windows):
+            counts = Counter(tokenize(w["text"]))
+            self.doc_len.append(sum(counts.values()))
+            for term, tf in counts.items():
+                docs, tfs = self.postings.setdefault(term, (array("I"), array("I")))
+                docs.append(doc_id)
+                tfs.append(tf)
+        n = len(self.doc_len)
+        self.avg_len = (sum(self.doc_len) / n) if n else 0.0
+
+    @classmethod
+    def from_video(cls, video, window: float = 30.0) -> "TranscriptIndex":
+        windows = stored_windows(video.id) if window == 30.0 else None
+        if windows:
+            return cls(windows)
+        with span("videodb_transcript", kind="words"):
+            words = video.get_transcript()
+        return cls(transcript_windows(words, window=window), window=window)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def _idf(self, df: int) -> float:
+        n = len(self.doc_len)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def scores(self, query: str) -> Dict[int, float]:
+        acc: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            docs, tfs = posting
+            idf = self._idf(len(docs))
+            for doc_id, tf in zip(docs, tfs):
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[doc_id] / (self.avg_len or 1))
+                acc[doc_id] = acc.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return acc
+
+    def search(self, queries, max_results: int = 5, ceiling: float = 100.0) -> List[Dict]:
+        # Accepts a single query or the expansion list from rewrite_query. The best hit
+        # scores `ceiling`; callers merging with remote hits pass something below theirs.
+        if isinstance(queries, str):
+            queries = [queries]
+        acc: Dict[int, float] = {}
+        for q in queries:
+            for doc_id, s in self.scores(q).items():
+                acc[doc_id] = max(acc.get(doc_id, 0.0), s)
+        if not acc:
+            return []
+        ranked = sorted(acc.items(), key=lambda kv: kv[1], reverse=True)[:max_results]
+        top = ranked[0][1] or 1.0
+
+        segments = []
+        for doc_id, s in ranked:
+            start = self.starts[doc_id]
+            segments.append(
+                {
+                    "start_time": int(start),
+                    "end_time": int(self.ends[doc_id]),
+                    "timestamp": f"{int(start//60):02d}:{int(start%60):02d}",
+                    "text": self.texts[doc_id][:220],
+                    # relative to the best hit so it reads like the remote percentages
+                    "score": round(ceiling * s / top, 1),
+                }
+            )
+        return segments
+
+
+_INDEXES: Dict[str, TranscriptIndex] = {}
+_LOCK = threading.Lock()
+
+
+def build_transcript_index(video, window: float = 30.0) -> Optional[TranscriptIndex]:
+    try:
+        idx = TranscriptIndex.from_video(video, window=window)
+    except Exception as e:
+        print(f"Transcript index warn: {e}")
+        return None
+    if not len(idx):
+        # transcript not ready yet; try again on the next question
+        return None
+    with _LOCK:
+        _INDEXES[video.id] = idx
+    return idx
+
+
+def get_transcript_index(video, build: bool = True) -> Optional[TranscriptIndex]:
+    with _LOCK:
+        idx = _INDEXES.get(getattr(video, "id", None))
+    if idx is None and build:
+        idx = build_transcript_index(video)
+    return idx
+
+
+def _indexed_windows(video_id: str) -> Optional[List[Dict]]:
+    # an index already in memory saves the transcript store a second download
+    with _LOCK:
+        idx = _INDEXES.get(video_id)
+    if idx is None or idx.window != 30.0:
+        return None
+    return [{"start": s, "end": e, "text": t} for s, e, t in zip(idx.starts, idx.ends, idx.texts)]
+
+
+add_window_source(_indexed_windows)
@@ -0,0 +1,237 @@
+import io
+import json
+import mmap
+import os
+import re
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Iterator, List, Optional, Tuple
+
+from metrics import span
+from resilience import SingleFlight
+from transcript_index import stored_windows, transcript_windows
+from videodb_utils import get_transcript_text_safe
+
+PAGE_CHARS = 4000
+_SAFE_RE = re.compile(r"[^A-Za-z0-9_.-]")
+_WS_RE = re.compile(r"[\t\r\n]+")
+
+
+def _ts(seconds: float) -> str:
+    return f"{int(seconds//60):02d}:{int(seconds%60):02d}"
+
+
+def _format_line(start: float, text: str) -> str:
+    return f"[{_ts(start)}] {text}"
+
+
+class TranscriptDoc:
+    """One video's transcript on disk: zlib blocks in a memory-mapped file plus a time index.
+
+    Each block is a page of "start<TAB>end<TAB>text" lines. Only the blocks a
+    caller asks for are decompressed. The file is mapped on first read and
+    re-mapped after close(), so the store can release idle docs safely.
+    """
+
+    def __init__(self, data_path: str, index_path: str):
+        with open(index_path) as f:
+            meta = json.load(f)
+        # [start, end, offset, length] per block
+        self.blocks: List[List[float]] = meta["blocks"]
+        self.chars = meta.get("chars", 0)
+        self.data_path = data_path
+        self._file = None
+        self._mm = None
+        self._lock = threading.Lock()
+
+    def _read(self, offset: int, length: int) -> bytes:
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.data_path, "rb")
+                if os.fstat(self._file.fileno()).st_size:
+                    self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            return self._mm[offset:offset + length]
+
+    @property
+    def num_pages(self) -> int:
+        return len(self.blocks)
+
+    def _lines(self, i: int) -> List[Tuple[float, float, str]]:
+        _, _, offset, length = self.blocks[i]
+        raw = zlib.decompress(self._read(int(offset), int(length))).decode("utf-8")
+        lines = []
+        for row in raw.split("\n"):
+            start, end, text = row.split("\t", 2)
+            lines.append((float(start), float(end), text))
+        return lines
+
+    def page(self, i: int) -> str:
+        if not 0 <= i < len(self.blocks):
+            return ""
+        return "\n".join(_format_line(s, t) for s, _, t in self._lines(i))
+
+    def time_range(self, t1: float, t2: float) -> str:
+        out = []
+        for i, (start, end, _, _) in enumerate(self.blocks):
+            if end < t1 or start > t2:
+                continue
+            out += [_format_line(s, t) for s, e, t in self._lines(i) if e >= t1 and s <= t2]
+        return "\n".join(out)
+
+    def iter_lines(self) -> Iterator[Tuple[float, float, str]]:
+        for i in range(len(self.blocks)):
+            yield from self._lines(i)
+
+    def iter_pages(self) -> Iterator[str]:
+        for i in range(len(self.blocks)):
+            yield self.page(i)
+
+    def open(self) -> io.BufferedReader:
+        """File-like view of the full transcript that decompresses one page at a time."""
+        return io.BufferedReader(_PageReader(self))
+
+    def close(self):
+        with self._lock:
+            if self._mm is not None:
+                self._mm.close()
+            if self._file is not None:
+                self._file.close()
+            self._file = self._mm = None
+
+
+class _PageReader(io.RawIOBase):
+    def __init__(self, doc: TranscriptDoc):
+        self._pages = doc.iter_pages()
+        self._buf = b""
+        self._first = True
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buf:
+            page = next(self._pages, None)
+            if page is None:
+                return 0
+            self._buf = page.encode("utf-8") if self._first else ("\n" + page).encode("utf-8")
+            self._first = False
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+
+def write_transcript(data_path: str, index_path: str, lines: List[Tuple[float, float, str]],
+                     page_chars: int = PAGE_CHARS):
+    blocks, offset, chars = [], 0, 0
+    tmp_data = data_path + ".tmp"
+    with open(tmp_data, "wb") as f:
+        i = 0
+        while i < len(lines):
+            page, size = [], 0
+            while i < len(lines) and (not page or size + len(lines[i][2]) <= page_chars):
+                page.append(lines[i])
+                size += len(lines[i][2]) + 1
+                i += 1
+            raw = "\n".join(f"{s}\t{e}\t{_WS_RE.sub(' ', t)}" for s, e, t in page).encode("utf-8")
+            comp = zlib.compress(raw, 6)
+            f.write(comp)
+            blocks.append([page[0][0], page[-1][1], offset, len(comp)])
+            offset += len(comp)
+            chars += size
+    tmp_index = index_path + ".tmp"
+    with open(tmp_index, "w") as f:
+        json.dump({"blocks": blocks, "chars": chars}, f)
+    os.replace(tmp_data, data_path)
+    os.replace(tmp_index, index_path)
+
+
+def transcript_lines(video) -> List[Tuple[float, float, str]]:
+    windows = stored_windows(video.id)
+    if windows:
+        return [(w["start"], w["end"], w["text"]) for w in windows]
+    try:
+        with span("videodb_transcript", kind="words"):
+            words = video.get_transcript()
+    except Exception:
+        words = []
+    lines = [(w["start"], w["end"], w["text"]) for w in transcript_windows(words)]
+    if lines:
+        return lines
+    # no word timestamps; fall back to plain text without offsets
+    text = get_transcript_text_safe(video) or ""
+    return [(0.0, 0.0, text[i:i + PAGE_CHARS]) for i in range(0, len(text), PAGE_CHARS)]
+
+
+class TranscriptStore:
+    def __init__(self, root: Optional[str] = None, max_open: int = 64):
+        self.root = root or os.path.join(tempfile.gettempdir(), "videorag-transcripts")
+        os.makedirs(self.root, exist_ok=True)
+        # LRU of docs with a mapped file; the least recent is closed past max_open
+        self.max_open = max_open
+        self._docs: "OrderedDict[str, TranscriptDoc]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._fetches = SingleFlight()
+
+    def _paths(self, video_id: str) -> Tuple[str, str]:
+        base = os.path.join(self.root, _SAFE_RE.sub("_", str(video_id)))
+        return base + ".tsb", base + ".json"
+
+    def get(self, video, fetch: bool = True) -> Optional[TranscriptDoc]:
+        with self._lock:
+            doc = self._docs.get(video.id)
+            if doc is not None:
+                self._docs.move_to_end(video.id)
+                return doc
+        data_path, index_path = self._paths(video.id)
+        if not os.path.exists(index_path):
+            if not fetch:
+                return None
+            # downloads run outside the store lock; callers for one video share a fetch
+            if not self._fetches.do(video.id, lambda: self._fetch(video, data_path, index_path)):
+                # transcript not ready yet; try again next time
+                return None
+        return self._open(video.id, data_path, index_path)
+
+    def _fetch(self, video, data_path: str, index_path: str) -> bool:
+        if os.path.exists(index_path):
+            return True
+        lines = transcript_lines(video)
+        if lines:
+            write_transcript(data_path, index_path, lines)
+        return bool(lines)
+
+    def _open(self, video_id: str, data_path: str, index_path: str) -> TranscriptDoc:
+        with self._lock:
+            doc = self._docs.get(video_id)
+            if doc is None:
+                doc = self._docs[video_id] = TranscriptDoc(data_path, index_path)
+            self._docs.move_to_end(video_id)
+            while len(self._docs) > self.max_open:
+                _, old = self._docs.popitem(last=False)
+                old.close()
+            return doc
+
+    def drop(self, video_id: str):
+        with self._lock:
+            doc = self._docs.pop(video_id, None)
+            if doc is not None:
+                doc.close()
+            for path in self._paths(video_id):
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+_STORE: Optional[TranscriptStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_transcript_store() -> TranscriptStore:
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            # set VIDEORAG_TRANSCRIPT_DIR to keep transcripts across restarts
+            _STORE = TranscriptStore(os.getenv("VIDEORAG_TRANSCRIPT_DIR") or None)
+        return _STORE
@@ -0,0 +1,124 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+
+class TTLCache:
+    """LRU + TTL cache for JSON-able values, optionally backed by SQLite.
+
+    The first element of each key is its group, so all entries for e.g. one
+    video can be dropped at once with invalidate().
+    """
+
+    table = "ttl_cache"
+
+    def __init__(self, max_entries: int = 2048, ttl: float = 24 * 3600, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._mem: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, grp TEXT, created REAL, value TEXT)"
+            )
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_grp ON {self.table}(grp)")
+            self._db.commit()
+
+    @staticmethod
+    def _copy(value):
+        return list(value) if isinstance(value, list) else value
+
+    def get(self, key: Tuple):
+        now = time.time()
+        with self._lock:
+            item = self._mem.get(key)
+            if item is None and self._db is not None:
+                row = self._db.execute(
+                    f"SELECT created, value FROM {self.table} WHERE key = ?", (json.dumps(key),)
+                ).fetchone()
+                if row:
+                    item = (row[0], json.loads(row[1]))
+                    self._mem[key] = item
+            if item is None or now - item[0] > self.ttl:
+                if item is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._mem.move_to_end(key)
+            self.hits += 1
+            return self._copy(item[1])
+
+    def set(self, key: Tuple, value, created: Optional[float] = None):
+        # created lets restored entries keep their original age
+        now = time.time() if created is None else created
+        with self._lock:
+            self._mem[key] = (now, self._copy(value))
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.max_entries:
+                self._mem.popitem(last=False)
+            if self._db is not None:
+                self._db.execute(
+                    f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?)",
+                    (json.dumps(key), str(key[0]), now, json.dumps(value)),
+                )
+                # keep the on-disk table bounded too, oldest first
+                self._db.execute(
+                    f"DELETE FROM {self.table} WHERE key NOT IN "
+                    f"(SELECT key FROM {self.table} ORDER BY created DESC LIMIT ?)",
+                    (self.max_entries,),
+                )
+                self._db.commit()
+
+    def _drop(self, key: Tuple):
+        self._mem.pop(key, None)
+        if self._db is not None:
+            self._db.execute(f"DELETE FROM {self.table} WHERE key = ?", (json.dumps(key),))
+            self._db.commit()
+
+    def invalidate(self, group):
+        grp = str(group)
+        with self._lock:
+            for key in [k for k in self._mem if str(k[0]) == grp]:
+                del self._mem[key]
+            if self._db is not None:
+                self._db.execute(f"DELETE FROM {self.table} WHERE grp = ?", (grp,))
+                self._db.commit()
+
+    def items(self) -> Iterator[Tuple[Tuple, float, Any]]:
+        """(key, created, value) for every live entry; reads SQLite when configured."""
+        now = time.time()
+        with self._lock:
+            if self._db is not None:
+                rows = self._db.execute(f"SELECT key, created, value FROM {self.table}").fetchall()
+                entries = [(tuple(json.loads(k)), c, json.loads(v)) for k, c, v in rows]
+            else:
+                entries = [(k, c, self._copy(v)) for k, (c, v) in self._mem.items()]
+        for key, created, value in entries:
+            if now - created <= self.ttl:
+                yield key, created, value
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            if self._db is not None:
+                self._db.execute(f"DELETE FROM {self.table}")
+                self._db.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "entries": len(self._mem),
+            }
@@ -1,52 +1,205 @@
+import inspect
 import os
-from typing import Optional, Tuple, List, Dict
+import shutil
+import tempfile
+import threading
+import time
+from typing import Callable, Optional, Tuple, List, Dict
 import streamlit as st
 import videodb
 
+from metrics import span
+from ingest_catalog import get_ingest_catalog, source_key_for_file, source_key_for_url
+from resilience import SingleFlight
+from search_cache import get_search_cache
+
+
+# Process-wide handles shared across Streamlit reruns and sessions.
+REGISTRY_TTL = 600.0
+_REGISTRY_LOCK = threading.Lock()
+_CONNECTIONS: Dict[str, object] = {}
+_COLLECTIONS: Dict[Tuple, Tuple[float, object]] = {}
+_VIDEOS: Dict[Tuple, Tuple[float, object]] = {}
+
 
 def connect_videodb(api_key: str):
-    conn = videodb.connect(api_key=api_key)
-    return conn
+    with _REGISTRY_LOCK:
+        conn = _CONNECTIONS.get(api_key)
+        if conn is None:
+            conn = videodb.connect(api_key=api_key)
+            _CONNECTIONS[api_key] = conn
+        return conn
+
+
+def ensure_collection(conn, name: str, ttl: float = REGISTRY_TTL):
+    key = (id(conn), name)
+    with _REGISTRY_LOCK:
+        item = _COLLECTIONS.get(key)
+    if item and time.time() - item[0] < ttl:
+        return item[1]
+    # lookup first; creating only succeeds once per name
+    try:
+        coll = conn.get_collection(name)
+    except Exception:
+        coll = conn.create_collection(name, f"Collection {name}")
+    with _REGISTRY_LOCK:
+        _COLLECTIONS[key] = (time.time(), coll)
+    return coll
+
+
+def remember_video(collection, video):
+    with _REGISTRY_LOCK:
+        _VIDEOS[(collection.id, video.id)] = (time.time(), video)
+
+
+def list_videos(collection, ttl: float = REGISTRY_TTL):
+    key = (collection.id, "*")
+    with _REGISTRY_LOCK:
+        item = _VIDEOS.get(key)
+    if item and time.time() - item[0] < ttl:
+        return item[1]
+    videos = collection.get_videos()
+    now = time.time()
+    with _REGISTRY_LOCK:
+        _VIDEOS[key] = (now, videos)
+        for v in videos:
+            _VIDEOS[(collection.id, v.id)] = (now, v)
+    return videos
+
+
+def get_video(collection, video_id: str, ttl: float = REGISTRY_TTL):
+    key = (collection.id, video_id)
+    with _REGISTRY_LOCK:
+        item = _VIDEOS.get(key)
+    if item and time.time() - item[0] < ttl:
+        return item[1]
+    video = collection.get_video(video_id)
+    remember_video(collection, video)
+    return video
+
 
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+# Override with VIDEORAG_UPLOAD_DIR to keep large temp uploads off the system tmp.
+UPLOAD_TMP_DIR = os.getenv("VIDEORAG_UPLOAD_DIR") or None
 
-def ensure_collection(conn, name: str):
+
+def _upload_accepts(collection, param: str) -> bool:
+    try:
+        return param in inspect.signature(collection.upload).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def copy_in_chunks(src, dst, total: Optional[int] = None, progress: Optional[Callable] = None,
+                   chunk_size: int = UPLOAD_CHUNK_SIZE) -> int:
+    done = 0
+    while True:
+        chunk = src.read(chunk_size)
+        if not chunk:
+            break
+        dst.write(chunk)
+        done += len(chunk)
+        if progress:
+            progress(done, total)
+    return done
+
+
+def _upload_file(collection, file, progress: Optional[Callable] = None):
+    if hasattr(file, "seek"):
+        file.seek(0)
+    # Newer SDKs can take the file object directly, no temp copy needed.
+    if _upload_accepts(collection, "file"):
+        return collection.upload(file=file)
+
+    # Otherwise stream to a private temp dir in fixed chunks and remove it afterwards.
+    tmp_dir = tempfile.mkdtemp(prefix="videorag-upload-", dir=UPLOAD_TMP_DIR)
+    try:
+        tmp_path = os.path.join(tmp_dir, os.path.basename(file.name))
+        with open(tmp_path, "wb") as f:
+            copy_in_chunks(file, f, total=getattr(file, "size", None), progress=progress)
+        if _upload_accepts(collection, "file_path"):
+            return collection.upload(file_path=tmp_path)
+        return collection.upload(path=tmp_path)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _catalog_video(collection, source_key: str):
+    video_id = get_ingest_catalog().lookup(collection.id, source_key)
+    if not video_id:
+        return None
     try:
-        return conn.create_collection(name, f"Collection {name}")
+        return get_video(collection, video_id)
     except Exception:
-        return conn.get_collection(name)
+        # deleted on the VideoDB side, upload again
+        get_ingest_catalog().forget(collection.id, source_key)
+        return None
+
+
+# lookup + upload + record must be atomic per source, or two workers both miss and upload
+_UPLOADS = SingleFlight()
 
 
-def upload_video_any(collection, url: Optional[str] = None, file=None) -> Tuple[Optional[object], Optional[str]]:
+def _upload_once(collection, key: Optional[str], upload: Callable):
+    def run():
+        existing = _catalog_video(collection, key)
+        if existing is not None:
+            return existing
+        vid = upload()
+        if vid is not None:
+            get_ingest_catalog().record(collection.id, key, vid.id)
+        return vid
+
+    if not key:
+        return upload()
+    return _UPLOADS.do((collection.id, key), run)
+
+
+def upload_video_any(collection, url: Optional[str] = None, file=None,
+                     progress: Optional[Callable] = None,
+                     dedupe: bool = True) -> Tuple[Optional[object], Optional[str]]:
     if url:
-        vid = collection.upload(url=url)
-        return vid, url
+        key = source_key_for_url(url) if dedupe else None
+
+        def upload():
+            with span("videodb_upload", source="url"):
+                return collection.upload(url=url)
+        return _upload_once(collection, key, upload), url
     if file is not None:
-        # Streamlit uploads give file-like object. Save then upload path.
-        # But VideoDB can take file-like in some versions; use path for safety.
-        tmp_path = os.path.join(os.getcwd(), f"uploaded_{file.name}")
-        with open(tmp_path, "wb") as f:
-            f.write(file.read())
-        vid = collection.upload(path=tmp_path)
-        return vid, None
+        key = source_key_for_file(file) if dedupe else None
+
+        def upload():
+            with span("videodb_upload", source="file"):
+                return _upload_file(collection, file, progress=progress)
+        return _upload_once(collection, key, upload), None
     raise ValueError("Provide a YouTube URL or upload a file.")
 
 
-def ensure_index_spoken(video):
+def ensure_index_spoken(video, force: bool = False):
+    catalog = get_ingest_catalog()
+    if not force and catalog.is_indexed(video.id):
+        return
     try:
-        video.index_spoken_words()
+        with span("videodb_index", benign=("already",)):
+            video.index_spoken_words()
+        # fresh index, so any cached results for this video are stale
+        get_search_cache().invalidate(video.id)
     except Exception as e:
         if "already" in str(e).lower():
             pass
         else:
             raise
+    catalog.mark_indexed(video.id)
 
 
 def get_transcript_text_safe(video) -> str:
     try:
-        return video.get_transcript_text()
+        with span("videodb_transcript", kind="text"):
+            return video.get_transcript_text()
     except Exception:
         try:
-            tr = video.get_transcript()
+            with span("videodb_transcript", kind="words"):
+                tr = video.get_transcript()
             return getattr(tr, "text", "")
         except Exception:
             return ""
@@ -1,19 +1,98 @@
-from typing import List, Dict
+import os
+import time
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional
+import numpy as np
 from videodb import SearchType, IndexType
 
+from metrics import span
+from resilience import videodb_call
+from search_cache import cache_key, get_search_cache
+from segment_store import SegmentStore
+from transcript_index import get_transcript_index
+from videodb_utils import list_videos
+
+
+# Shared across sessions so Streamlit reruns don't spin up new threads each time. Only
+# multi-expansion batches use it; size it to the concurrent searches a process serves.
+_SEARCH_POOL = ThreadPoolExecutor(
+    max_workers=int(os.getenv("VIDEORAG_SEARCH_THREADS", "32")), thread_name_prefix="videorag-search"
+)
+# Per-video searches for CollectionRAG; each runs its expansions sequentially.
+_COLLECTION_POOL = ThreadPoolExecutor(max_workers=16, thread_name_prefix="videorag-collection")
+
+
+def _run_on_thread(fn, *args) -> Future:
+    # a lone call gets its own thread, so it never queues behind other sessions' batches
+    future: Future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="videorag-call", daemon=True).start()
+    return future
+
+
+def _timed(started: Dict, i: int, fn, *args):
+    started[i] = time.monotonic()
+    return fn(*args)
+
+
+def _wait_calls(futures: List[Future], started: Dict, call_timeout: float, ends_at: float,
+                ordered: bool) -> Iterator[int]:
+    """Indexes of finished calls; each gets call_timeout from its own start, all stop at ends_at.
+
+    Time spent queued for a pool thread counts against the deadline only.
+    """
+    pending = set(range(len(futures)))
+    done_order: List[int] = []
+    while pending:
+        now = time.monotonic()
+        expired = {i for i in pending if i in started and now - started[i] >= call_timeout}
+        pending -= expired
+        if not pending or now >= ends_at:
+            break
+        limit = min([ends_at] + [started[i] + call_timeout for i in pending if i in started])
+        done, _ = wait([futures[i] for i in pending], timeout=max(0.0, limit - now), return_when=FIRST_COMPLETED)
+        for i in sorted(i for i in pending if futures[i] in done):
+            pending.discard(i)
+            if ordered:
+                done_order.append(i)
+            else:
+                yield i
+    if ordered:
+        # keep expansion order so results stay deterministic
+        yield from sorted(done_order)
+
+
+# (trigger words, expansions) pairs used by rewrite_query; results for these are predictable per video
+CANNED_EXPANSIONS = [
+    (["main topic", "about", "overview", "summary"], ["overview", "introduction", "main idea", "summary"]),
+    (["key concept", "concept", "definition"], ["key concept", "main concept", "definition", "core idea"]),
+    (["example", "demo", "case"], ["example", "for example", "demonstration", "case study"]),
+]
+
+# Defaults shown in the app's Ask, Quiz and Highlight Reel tabs.
+DEFAULT_QUESTION = "What is the main topic?"
+DEFAULT_QUIZ_TOPIC = "main concepts"
+DEFAULT_REEL_TOPICS = ["overview", "example", "key concept"]
+
 
 def rewrite_query(question: str) -> List[str]:
     q = question.lower()
-    if any(k in q for k in ["main topic", "about", "overview", "summary"]):
-        return ["overview", "introduction", "main idea", "summary"]
-    if any(k in q for k in ["key concept", "concept", "definition"]):
-        return ["key concept", "main concept", "definition", "core idea"]
-    if any(k in q for k in ["example", "demo", "case"]):
-        return ["example", "for example", "demonstration", "case study"]
+    for triggers, expansions in CANNED_EXPANSIONS:
+        if any(k in q for k in triggers):
+            return list(expansions)
     return [question]
 
 
-def shots_to_segments(search_res, max_results: int = 5) -> List[Dict]:
+def shots_to_store(search_res, max_results: Optional[int] = None) -> SegmentStore:
     shots = []
     try:
         shots = search_res.get_shots() or []
@@ -22,85 +101,364 @@ def shots_to_segments(search_res, max_results: int = 5) -> List[Dict]:
             shots = list(search_res)
         except Exception:
             shots = []
+    if max_results is not None:
+        shots = shots[:max_results]
+    return SegmentStore.from_shots(shots)
 
-    segments = []
-    for s in shots[:max_results]:
-        start = getattr(s, "start", 0)
-        end = getattr(s, "end", start + 30)
-        text = (getattr(s, "text", "") or "").strip()
-        score = getattr(s, "search_score", getattr(s, "score", 0.0))
-        try:
-            score = float(score)
-            score = round(score * 100, 1) if score <= 1 else round(score, 1)
-        except Exception:
-            score = 0.0
-        ts = f"{int(start//60):02d}:{int(start%60):02d}"
-        segments.append(
-            {
-                "start_time": int(start),
-                "end_time": int(end),
-                "timestamp": ts,
-                "text": text[:220],
-                "score": score,
-            }
-        )
-    return segments
+
+def shots_to_segments(search_res, max_results: int = 5) -> List[Dict]:
+    return shots_to_store(search_res, max_results).to_dicts()
+
+
+class SearchPlan:
+    """Running state for one question: deduped segments, budget and stages run."""
+
+    def __init__(self, max_results: int, min_score: float, max_calls: int, deadline: float):
+        self.max_results = max_results
+        self.min_score = min_score
+        self.max_calls = max_calls
+        self.started = time.monotonic()
+        self.ends_at = self.started + deadline
+        self.store = SegmentStore.empty()
+        self.stages: List[str] = []
+        self.calls = 0
+        self.errors: List[str] = []
+        self._good = 0
+        self._seen = np.zeros(0, dtype=np.int64)
+        self._lock = threading.Lock()
+
+    def add(self, store: SegmentStore) -> SegmentStore:
+        # dedupe by whole-second start_time, first occurrence wins; returns the rows that were new
+        if not len(store):
+            return store
+        keys = store.start.astype(np.int64)
+        _, first = np.unique(keys, return_index=True)
+        first = np.sort(first)
+        first = first[~np.isin(keys[first], self._seen)]
+        added = store.take(first)
+        self._seen = np.concatenate([self._seen, keys[first]])
+        self.store = SegmentStore.concat([self.store, added])
+        self._good += int(np.count_nonzero(added.score >= self.min_score))
+        return added
+
+    def count_call(self):
+        with self._lock:
+            self.calls += 1
+
+    def satisfied(self) -> bool:
+        return self._good >= self.max_results
+
+    def calls_left(self) -> int:
+        return self.max_calls - self.calls
+
+    def time_left(self) -> float:
+        return self.ends_at - time.monotonic()
+
+    def report(self) -> Dict:
+        return {
+            "stages": list(self.stages),
+            "remote_calls": self.calls,
+            "errors": list(self.errors),
+            "segments": len(self.store),
+            "satisfied": self.satisfied(),
+            "elapsed": round(time.monotonic() - self.started, 3),
+        }
 
 
 class VideoRAG:
-    def __init__(self, video, collection=None):
+    def __init__(
+        self,
+        video,
+        collection=None,
+        concurrent: bool = True,
+        call_timeout: float = 8.0,
+        deadline: float = 20.0,
+        local_index=None,
+        use_local_index: bool = True,
+        cache=None,
+        use_cache: bool = True,
+        batch_size: int = 2,
+        max_calls: int = 8,
+        min_score: float = 0.0,
+    ):
         self.video = video
         self.collection = collection
+        # concurrent=False keeps the old one-call-at-a-time behaviour
+        self.concurrent = concurrent
+        self.call_timeout = call_timeout
+        self.deadline = deadline
+        self._local_index = local_index
+        self.use_local_index = use_local_index
+        self.cache = cache if cache is not None else (get_search_cache() if use_cache else None)
+        # expansions are sent batch_size at a time so a good first batch ends the search
+        self.batch_size = batch_size
+        self.max_calls = max_calls
+        self.min_score = min_score
+        self.last_plan: Dict = {}
 
-    def search_video_content(self, question: str, max_results: int = 5):
+    @property
+    def local_index(self):
+        if self._local_index is None and self.use_local_index:
+            self._local_index = get_transcript_index(self.video)
+        return self._local_index
+
+    def _cached_search(self, key, call, label: str, max_results: int, plan=None) -> SegmentStore:
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return SegmentStore.from_json(cached).head(max_results)
+        if plan is not None:
+            plan.count_call()
+        try:
+            with span("videodb_search", benign=("No results found",), stage=label.lower()):
+                # identical calls from other sessions share one request; transient errors retry
+                res = videodb_call(key, call)
+            store = shots_to_store(res, key[-1])
+        except Exception as e:
+            if "No results found" not in str(e):
+                print(f"{label} warn: {e}")
+                if plan is not None:
+                    plan.errors.append(f"{label}: {e}")
+                return SegmentStore.empty()
+            store = SegmentStore.empty()
+        if self.cache is not None:
+            self.cache.set(key, store.to_json())
+        return store.head(max_results)
+
+    def _search_one(self, q: str, search_type, label: str, max_results: int, plan=None) -> SegmentStore:
+        top_k = 10
+        key = cache_key(self.video.id, q, search_type, IndexType.spoken_word, top_k)
+        return self._cached_search(
+            key,
+            lambda: self.video.search(
+                query=q,
+                search_type=search_type,
+                index_type=IndexType.spoken_word,
+                top_k=top_k,
+            ),
+            label,
+            max_results,
+            plan,
+        )
+
+    def _iter_batch(self, batch: List[str], search_type, label: str, max_results: int, plan,
+                    ordered: bool = True) -> Iterator[SegmentStore]:
+        # call_timeout and the deadline apply to single calls as well, so they still run off-thread
+        started: Dict[int, float] = {}
+        args = [(started, i, self._search_one, q, search_type, label, max_results, plan) for i, q in enumerate(batch)]
+        if len(batch) == 1:
+            futures = [_run_on_thread(_timed, *args[0])]
+        else:
+            futures = [_SEARCH_POOL.submit(_timed, *a) for a in args]
+        finished = 0
+        for i in _wait_calls(futures, started, self.call_timeout, plan.ends_at, ordered):
+            finished += 1
+            yield futures[i].result()
+        if finished < len(futures):
+            print(f"{label} warn: {len(futures) - finished} of {len(futures)} searches timed out")
+            for f in futures:
+                f.cancel()
+
+    def _iter_expansions(self, expansions: List[str], search_type, label: str, max_results: int, plan,
+                         ordered: bool = True) -> Iterator[SegmentStore]:
+        batch_size = (self.batch_size or len(expansions)) if self.concurrent else 1
+        pending = list(expansions)
+        while pending and not plan.satisfied():
+            if plan.time_left() <= 0:
+                print(f"{label} warn: deadline reached, skipping remaining expansions")
+                break
+            n = min(batch_size, len(pending), plan.calls_left())
+            if n <= 0:
+                print(f"{label} warn: call budget spent, skipping remaining expansions")
+                break
+            batch, pending = pending[:n], pending[n:]
+            for segments in self._iter_batch(batch, search_type, label, max_results, plan, ordered):
+                yield plan.add(segments)
+
+    def _search_collection(self, question: str, max_results: int, plan=None) -> SegmentStore:
+        top_k = 10
+        coll_id = getattr(self.collection, "id", "collection")
+        key = cache_key(coll_id, question, "collection", "default", top_k)
+        return self._cached_search(
+            key,
+            lambda: self.collection.search(query=question, top_k=top_k),
+            "Collection",
+            max_results,
+            plan,
+        )
+
+    def _iter_stages(self, question: str, max_results: int, plan: SearchPlan,
+                     ordered: bool = True) -> Iterator[SegmentStore]:
         expansions = rewrite_query(question)
-        all_segments = []
 
         # semantic spoken
-        for q in expansions:
-            try:
-                res = self.video.search(
-                    query=q,
-                    search_type=SearchType.semantic,
-                    index_type=IndexType.spoken_word,
-                    top_k=10,
-                )
-                all_segments += shots_to_segments(res, max_results)
-            except Exception as e:
-                if "No results found" not in str(e):
-                    print(f"Semantic warn: {e}")
-
-        # keyword spoken
-        if not all_segments:
-            for q in expansions:
+        plan.stages.append("semantic")
+        yield from self._iter_expansions(expansions, SearchType.semantic, "Semantic", max_results, plan, ordered)
+
+        # keyword spoken: local BM25 over the transcript, remote only if unavailable
+        if not plan.satisfied():
+            if self.local_index is not None:
+                plan.stages.append("keyword-local")
+                # BM25 is relative to its own best hit, so rank every local hit below the
+                # weakest remote one instead of letting it sort to the top as 100%
+                ceiling = float(plan.store.score.min()) - 0.1 if len(plan.store) else 100.0
+                with span("local_search", stage="keyword"):
+                    hits = self.local_index.search(expansions, max_results, ceiling=max(ceiling, 0.0))
+                yield plan.add(SegmentStore.from_segments(hits))
+            else:
+                plan.stages.append("keyword")
+                yield from self._iter_expansions(expansions, SearchType.keyword, "Keyword", max_results, plan, ordered)
+
+        # collection semantic: last resort only, its hits may come from other videos
+        if (
+            not len(plan.store)
+            and self.collection
+            and plan.time_left() > 0
+            and plan.calls_left() > 0
+        ):
+            plan.stages.append("collection")
+            future = _run_on_thread(self._search_collection, question, max_results, plan)
+            done, _ = wait([future], timeout=max(0.0, min(self.call_timeout, plan.time_left())))
+            if future in done:
+                yield plan.add(future.result())
+            else:
+                print("Collection warn: search timed out")
+                future.cancel()
+
+    def search_store(self, question: str, max_results: int = 5) -> SegmentStore:
+        plan = SearchPlan(max_results, self.min_score, self.max_calls, self.deadline)
+        for _ in self._iter_stages(question, max_results, plan):
+            pass
+        self.last_plan = plan.report()
+        return plan.store.head(max_results)
+
+    def search_video_content(self, question: str, max_results: int = 5) -> List[Dict]:
+        return self.search_store(question, max_results).to_dicts()
+
+    def iter_search(self, question: str, max_results: int = 5) -> Iterator[List[Dict]]:
+        """Same search as search_video_content, yielding new segments as each call returns.
+
+        Segments arrive in completion order, already deduplicated against earlier
+        ones; at most max_results are yielded in total. last_plan is set once the
+        generator is exhausted.
+        """
+        plan = SearchPlan(max_results, self.min_score, self.max_calls, self.deadline)
+        sent = 0
+        try:
+            for added in self._iter_stages(question, max_results, plan, ordered=False):
+                added = added.head(max_results - sent)
+                if len(added):
+                    sent += len(added)
+                    yield added.to_dicts()
+        finally:
+            self.last_plan = plan.report()
+
+    def warm(self, queries: List[str], search_type=SearchType.semantic, deadline: Optional[float] = None) -> Dict:
+        """Run queries one at a time on the calling thread so their results land in the cache.
+
+        Meant for background threads: it never takes a slot in the shared search pool.
+        """
+        queries = list(dict.fromkeys(queries))
+        if self.cache is None:
+            return {"queries": 0, "remote_calls": 0}
+        deadline = self.deadline if deadline is None else deadline
+        plan = SearchPlan(len(queries), 0.0, len(queries), deadline)
+        for q in queries:
+            if plan.time_left() <= 0:
+                break
+            self._search_one(q, search_type, "Warm", 10, plan)
+        return {"queries": len(queries), "remote_calls": plan.calls}
+
+
+class CollectionRAG:
+    """Searches many videos of a collection at once and keeps a global top-k."""
+
+    def __init__(
+        self,
+        collection,
+        videos=None,
+        max_parallel: int = 8,
+        deadline: float = 30.0,
+        per_video_results: int = 3,
+        **rag_kwargs,
+    ):
+        self.collection = collection
+        self._videos = videos
+        self.max_parallel = max_parallel
+        self.deadline = deadline
+        self.per_video_results = per_video_results
+        # parallelism is across videos, so each video's own searches run in sequence
+        rag_kwargs.setdefault("concurrent", False)
+        self.rag_kwargs = rag_kwargs
+        self.last_run: Dict = {}
+
+    @property
+    def videos(self):
+        if self._videos is None:
+            self._videos = list_videos(self.collection)
+        return self._videos
+
+    def _search_video(self, video, question: str) -> SegmentStore:
+        kwargs = dict(self.rag_kwargs)
+        if "local_index" not in kwargs:
+            # only reuse transcript indexes that already exist; never download hundreds
+            kwargs["local_index"] = get_transcript_index(video, build=False)
+            kwargs["use_local_index"] = False
+        vr = VideoRAG(video, collection=None, **kwargs)
+        return vr.search_store(question, max_results=self.per_video_results).with_video_id(video.id)
+
+    def search(self, question: str, max_results: int = 10) -> List[Dict]:
+        ends_at = time.monotonic() + self.deadline
+        pending = iter(self.videos)
+        inflight = {}
+        best = SegmentStore.empty()
+        searched = failed = 0
+
+        def top_up():
+            while len(inflight) < self.max_parallel:
+                video = next(pending, None)
+                if video is None:
+                    return
+                inflight[_COLLECTION_POOL.submit(self._search_video, video, question)] = video
+
+        top_up()
+        while inflight:
+            remaining = ends_at - time.monotonic()
+            if remaining <= 0:
+                break
+            done, _ = wait(list(inflight), timeout=remaining, return_when=FIRST_COMPLETED)
+            for f in done:
+                video = inflight.pop(f)
                 try:
-                    res_kw = self.video.search(
-                        query=q,
-                        search_type=SearchType.keyword,
-                        index_type=IndexType.spoken_word,
-                        top_k=10,
-                    )
-                    all_segments += shots_to_segments(res_kw, max_results)
+                    store = f.result()
                 except Exception as e:
-                    if "No results found" not in str(e):
-                        print(f"Keyword warn: {e}")
-
-        # collection semantic
-        if not all_segments and self.collection:
-            try:
-                res_coll = self.collection.search(query=question, top_k=10)
-                all_segments += shots_to_segments(res_coll, max_results)
-            except Exception as e:
-                if "No results found" not in str(e):
-                    print(f"Collection warn: {e}")
-
-        # dedupe by start_time
-        seen = set()
-        unique = []
-        for s in all_segments:
-            key = int(s["start_time"])
-            if key not in seen:
-                seen.add(key)
-                unique.append(s)
-
-        return unique[:max_results]
+                    print(f"Collection warn ({video.id}): {e}")
+                    failed += 1
+                    continue
+                searched += 1
+                # running top-k; earlier rows win ties, as they arrived first
+                best = SegmentStore.concat([best, store]).top_k(max_results)
+            top_up()
+
+        # videos that never started count as timed out too
+        not_started = sum(1 for _ in pending)
+        if inflight or not_started:
+            print(f"Collection warn: deadline reached with {len(inflight)} videos still searching"
+                  f" and {not_started} not started")
+        self.last_run = {
+            "videos_searched": searched,
+            "videos_failed": failed,
+            "videos_timed_out": len(inflight) + not_started,
+        }
+        return best.to_dicts()
+
+
+def warm_video_cache(video, deadline: float = 120.0) -> Dict:
+    """Run the canned expansion searches once so first questions are served from the cache."""
+    queries = []
+    for _, expansions in CANNED_EXPANSIONS:
+        queries += expansions
+    for q in [DEFAULT_QUESTION, DEFAULT_QUIZ_TOPIC] + DEFAULT_REEL_TOPICS:
+        queries += rewrite_query(q)
+    vr = VideoRAG(video, collection=None, call_timeout=deadline, deadline=deadline)
+    return vr.warm(queries, deadline=deadline)